@@ -7,14 +7,27 @@ This file is meant to set up celery to handle background tasks like email notifi
 import os
 from celery import Celery
 from django.conf import settings
+from kombu.serialization import register
+import orjson
 import time
 from datetime import datetime
 
 #Set the default Django settings module for the celery program
-os.environ.setdefault('DJJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+
+def _orjson_dumps(obj):
+    # Decimals (prices in booking_details) go over the wire as strings, UUIDs and datetimes are native
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+
+
+# orjson codec for task and result payloads, selected with CELERY_TASK_SERIALIZER = 'orjson'.
+# Registered here because both the web process (publisher) and the worker import this module
+register('orjson', _orjson_dumps, orjson.loads, content_type='application/x-orjson', content_encoding='utf-8')
 
 # Create a celery instance and configure it
-app = Celery('alx_travel_app')
+# listings is the only app with tasks, so list its module explicitly instead of autodiscovering every installed app
+app = Celery('alx_travel_app', include=['listings.tasks'])
 
 # Using a string here means that the worker does not have to serialize
 # The configuration object to child procesess.
@@ -22,29 +35,27 @@ app = Celery('alx_travel_app')
 # Should have a 'CELERY_' prefix.
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
-# Load task modules from all registed Django app configs.
 
-app.autodiscover_tasks()
+# Task routes and queues are declared once, as CELERY_TASK_ROUTES and CELERY_TASK_QUEUES in settings
 
-#Configure task routes (advanced feature)
-app.conf.task_routes = {
-    'listings.tasks.send_booking_confirmation_email': {'queue': 'emails'},
-    'listings.tasks.send_booking_cancellation_email':{'queue':'emails'},
-    'listings.tasks.cleanup_old_logs': {'queue': 'maintenance'},
-}
+# Wait for the broker to confirm each publish so a burst of booking emails is not lost.
+# On Redis/SQS an unacked task is redelivered once the visibility timeout passes, so it is kept
+# far above the longest email retry delay (retry_backoff_max=600s) to avoid sending an email twice
+app.conf.broker_transport_options = {'confirm_publish': True, 'visibility_timeout': 43200}
 
 #Configure periodic tasks (scheduled tasks)
 from celery.schedules import crontab
 app.conf.beat_schedule = {
+    # Picks tomorrow's confirmed check-ins and queues their reminders in batches
     'send-daily-reminders': {
-        'task': 'listings.tasks.send_booking_reminder_email',
+        'task': 'queue_daily_booking_reminders',
         'schedule':crontab(hour=10, minute=0),
-        'options':{'queue': 'emails'}
+        'options':{'queue': 'maintenance'}
     },
 
     # Cleanup old logs every sunday at 2AM
     'weekly-cleanup': {
-        'task': 'listings.tasks.cleanup_old_logs',
+        'task': 'cleanup_old_logs',
         'schedule': crontab(hour=2, minute=0, day_of_week=0),
         'options': {'queue':'maintenance'}
     },
@@ -54,11 +65,16 @@ app.conf.beat_schedule = {
 app.conf.timezone = 'UTC'
 
 # Task result settings
-app.conf.result_expires = 3600 #The task results will expire after an hour
+app.conf.task_ignore_result = True # Tasks whose result is read opt back in with ignore_result=False
+app.conf.result_expires = 300 #The task results will expire after five minutes
 
 # Task execution settings for reliability
 app.conf.task_acks_late = True
-app.conf.worker_prefetch_multiplier = 1  # Ensures tasks are acknowledged only after completion
+# Email sending is I/O bound, so a prefetch of 2 keeps the next task ready while the SMTP call is in flight.
+# Long running workers (maintenance) can drop back to 1 through the environment.
+app.conf.worker_prefetch_multiplier = int(os.environ.get('CELERY_PREFETCH_MULTIPLIER', 2))
+
+# Per-queue worker options (pool, concurrency, prefetch) are set on each worker's launch command, see README.md
 
 # Debugging task for testing Celery setup
 @app.task(bind=True, ignore_result=True)
@@ -71,24 +87,25 @@ def debug_task(self):
 
 
 # Health check task
-@app.task(bind=True)
+# expires drops probes that sat in the queue too long instead of letting them pile up
+@app.task(bind=True, ignore_result=False, expires=5)
 def health_check(self):
     """
     Health check task to verify if Celery is working correctly.
     """
-    start_time = time.time()
+    start_time = time.monotonic()
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    # Simulate some work
-    time.sleep(1)
+    # Real broker round-trip instead of simulated work
+    replies = app.control.ping(timeout=0.2)
 
-    execution_time = time.time() - start_time
+    execution_time = time.monotonic() - start_time
 
     return {
-        'status': 'healthy',
-        'timestamp':'current_time',
-        'execution_time': round(execution_time, 2),
+        'status': 'healthy' if replies else 'degraded',
+        'timestamp': current_time,
+        'execution_time': round(execution_time, 3),
+        'workers_responding': len(replies),
         'worker_id': self.request.id,
         'host_name': self.request.hostname
     }
-    
\ No newline at end of file
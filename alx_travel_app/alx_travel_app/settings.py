@@ -112,12 +112,25 @@ DATABASES = {
         'OPTIONS' : {
             'init_command':"SET sql_mode = 'STRICT_TRANS_TABLES'"
         },
+        # Keep connections open between requests instead of reconnecting every time
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=600),
+        'CONN_HEALTH_CHECKS': True, # Drop a persistent connection that died before reusing it
 
 
     }
 }
 
 
+# Cache
+# Local memory by default. Set CACHE_URL (e.g. rediscache://localhost:6379/1) in production so
+# the Celery workers share the email dedup keys and the API processes share cached responses.
+# Local memory is per process: the email task status is then read from the Celery result backend
+# instead of the cache, and the email dedup and admin alert coalescing only hold within one worker process
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -180,7 +193,7 @@ REST_FRAMEWORK = {
        'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
        'PAGE_SIZE': 20, # Number of items per page
        'DEFAULT_RENDERER_CLASSES':[
-           'rest_framework.renderers.JSONRenderer',
+           'listings.renderers.ORJSONRenderer', # orjson encodes UUIDs and datetimes in C
            'rest_framework.renderers.BrowsableAPIRenderer'
        ],
 }
@@ -309,10 +322,13 @@ CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='rpc://')
 
 
 # Celery task  Configuration
-CELERY_ACCEPT_CONTENT = ['json'] 
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZERR = 'json'
-CELERY_IIMEZONE = 'UTC' 
+# orjson codec is registered in alx_travel_app/celery.py, json stays accepted for messages already queued
+CELERY_ACCEPT_CONTENT = ['orjson', 'json']
+CELERY_TASK_SERIALIZER = 'orjson'
+CELERY_RESULT_SERIALIZER = 'orjson'
+CELERY_TASK_COMPRESSION = 'zstd' # Compress message bodies on the wire (needs zstandard)
+CELERY_RESULT_COMPRESSION = 'zstd'
+CELERY_TIMEZONE = 'UTC'
 CELERY_ENABLE_UTC = True #
 
 # Task execution settings
@@ -322,10 +338,20 @@ CELERY_TASK_SOFT_TIME_LIMIT = 5 * 60
 CELERY_WORKER_CONCURRENCY = 4
 
 # Task Routing Configuration
+# Keyed by registered task name: the listings tasks are declared with an explicit name=, not their module path
 CELERY_TASK_ROUTES = {
-    'listings.tasks.send_booking_confirmation_email': {'queue': 'emails'},
-    'listings.tasks.send_booking_reminder_email': {'queue': 'emails'},
-    'listings.tasks.cleanup_old_logs': {'queue': 'maintenance'},
+    'send_booking_confirmation_email': {'queue': 'emails'},
+    'send_booking_reminder_email': {'queue': 'emails'},
+    'send_booking_reminder_emails_batch': {'queue': 'emails'},
+    'send_booking_cancellation_email': {'queue': 'emails'},
+    'cleanup_old_logs': {'queue': 'maintenance'},
+    'queue_daily_booking_reminders': {'queue': 'maintenance'},
+    # Admin alerts on their own low priority queue so they never delay guest emails
+    'send_admin_notification': {'queue': 'admin_lowpri'},
+    'flush_admin_notifications': {'queue': 'admin_lowpri'},
+    # Probes get their own queue so they never wait behind user traffic
+    'alx_travel_app.celery.health_check': {'queue': 'control'},
+    'alx_travel_app.celery.debug_task': {'queue': 'control'},
 }
 
 # QUEUE Configuration
@@ -343,14 +369,23 @@ CELERY_TASK_QUEUES = {
         'exchange': 'maintenance',
         'routing_key': 'maintenance',
     },
+    'control': {
+        'exchange': 'control',
+        'routing_key': 'control',
+    },
+    'admin_lowpri': {
+        'exchange': 'admin_lowpri',
+        'routing_key': 'admin_lowpri',
+    },
 }
 
 # TASK RESULT SETTINGS
-CELERY_RESULT_EXPIRES = 3600
-CELERY_TASL_RESULT_EXPIRES = 3600
+# Most tasks are fire and forget, so results are only stored for tasks that opt in with ignore_result=False
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_RESULT_EXPIRES = 300 # Stored results are only polled for a few minutes by the task monitor
 
 #Worker configuration
-CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_WORKER_PREFETCH_MULTIPLIER = config('CELERY_PREFETCH_MULTIPLIER', default=2, cast=int)
 CELERY_TASK_ACKS_LATE = True
 CELERY_WORKER_DISABLE_RATE_LIMITS = False
 
@@ -383,6 +418,9 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default = True, cast=bool)
 EMAIL__USE_SSL = config('EMAIL_USE_SSL', default=False, cast = bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+# Seconds before a stalled SMTP call fails, so a hung server ends in a retried TimeoutError
+# instead of running every attempt into CELERY_TASK_TIME_LIMIT
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
 
 
 #Email settings for the application
@@ -39,6 +39,16 @@ schema_view = get_schema_view (
     permission_classes = [permissions.AllowAny],
 )
 
+# Cache settings for the generated schema (one hour, namespaced per API version)
+SCHEMA_CACHE_TIMEOUT = 3600
+SCHEMA_CACHE_KWARGS = {'key_prefix': 'swagger-v1'}
+
+# Build the schema views once at import
+# The schema only changes on deploy, so cache it instead of re-introspecting every serializer per hit
+_SWAGGER_UI = schema_view.with_ui('swagger', cache_timeout = SCHEMA_CACHE_TIMEOUT, cache_kwargs = SCHEMA_CACHE_KWARGS)
+_REDOC_UI = schema_view.with_ui('redoc', cache_timeout = SCHEMA_CACHE_TIMEOUT, cache_kwargs = SCHEMA_CACHE_KWARGS)
+_JSON_VIEW = schema_view.without_ui(cache_timeout = SCHEMA_CACHE_TIMEOUT, cache_kwargs = SCHEMA_CACHE_KWARGS)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -47,9 +57,9 @@ urlpatterns = [
     path('api/v1/', include('listings.urls')), # Local app urls
 
     # Swagger URLS
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout = 0), name='schema-swagger-ui'),
-    path('redoc/',schema_view.with_ui('redoc', cache_timeout=0), name='schema-swagger-ui'),
-    path('swagger/json/',schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('swagger/', _SWAGGER_UI, name='schema-swagger-ui'),
+    path('redoc/', _REDOC_UI, name='schema-swagger-ui'),
+    path('swagger/json/', _JSON_VIEW, name='schema-json'),
 ]
 # Serve media files during development
 if settings.DEBUG:
@@ -6,7 +6,7 @@ making it easy to managge data through the admin panel or web interface
 """
 
 from django.contrib import admin
-from .models import Listing, Review, Booking, UserProfile
+from .models import AnalyticsSnapshot, Listing, Review, Booking, UserProfile
 
 
 @admin.register(UserProfile)
@@ -17,12 +17,14 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ['role', 'email_verified', 'created_at']
     search_fields = ['user__username', 'phone_number', 'user__email']
     readonly_fields = ['user_id', 'created_at']     # This are fields that can not ve altered in the admin interface
+    list_select_related = ['linked_user']
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
     """ Admin interface for listings"""
 
     list_display = ['name','host', 'property_type', 'price_per_night', 'status']
+    list_select_related = ['host__linked_user']   # host is rendered through the linked user's full name, join it instead of a query per row
     list_filter = ['status', 'property_type', 'room_type', 'city']
     search_fields = ['name', 'description', 'city']
     readonly_fields = ['property_id', 'created_at', 'updated_at']
@@ -46,6 +48,7 @@ class ListingAdmin(admin.ModelAdmin):
 class BookingAdmin(admin.ModelAdmin):
     """ Admin interface for bookings"""
     list_display = ['booking_id', 'listing', 'user', 'start_date', 'end_date', 'status', 'total_price']
+    list_select_related = ['listing', 'user__linked_user']
     list_filter = ['status', 'start_date', 'end_date']
     search_fields = ['property__name', 'user__username']
     readonly_fields = ['booking_id', 'created_at', 'updated_at']
@@ -55,6 +58,15 @@ class BookingAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['review_id', 'listing', 'user', 'rating', 'created_at', 'has_host_response']
+    list_select_related = ['listing', 'user__linked_user']
     list_filter = ['rating', 'created_at']
     search_fields = ['property__name', 'user__username', 'comment']
-    readonly_fields = ['review_id', 'created_at']
\ No newline at end of file
+    readonly_fields = ['review_id', 'created_at']
+
+@admin.register(AnalyticsSnapshot)
+class AnalyticsSnapshotAdmin(admin.ModelAdmin):
+    """ Read-only view of the daily analytics snapshots"""
+
+    list_display = ['date', 'total_bookings', 'confirmed_bookings', 'completed_bookings', 'active_listings', 'average_rating']
+    date_hierarchy = 'date'
+    readonly_fields = ['processed_at']
@@ -4,11 +4,110 @@ Custom filter classes for advanced filtering capabilities.
 These filters provide advanced search and filtering options for our API endpoints.
 """
 
+import re
+
 import django_filters
 from django_filters import rest_framework as filters
+from django.db import connection
+from django.db.models import Exists, FloatField, OuterRef
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
 from .models import Listing, Booking
 
 
+# Valid choice values, computed once at import instead of on every request
+_PROPERTY_TYPES = frozenset(choice for choice, _ in Listing.PROPERTY_TYPE_CHOICES)
+_ROOM_TYPES = frozenset(choice for choice, _ in Listing.ROOM_TYPE_CHOICES)
+
+
+class ChoiceInFilter(filters.BaseInFilter, filters.CharFilter):
+    """
+    Comma separated choice filter, e.g. ?property_type=house,villa
+
+    The query string is split once and checked against a precomputed set
+    of valid values instead of going through per-value form validation.
+    """
+
+    def __init__(self, *args, valid_choices=frozenset(), **kwargs):
+        kwargs.setdefault('lookup_expr', 'in')
+        super().__init__(*args, **kwargs)
+        self.valid_choices = valid_choices
+
+    def filter(self, qs, value):
+        if value:
+            value = [v for v in value if v in self.valid_choices]
+            if not value:
+                # None of the requested values exist, nothing can match
+                return qs.none()
+        return super().filter(qs, value)
+
+
+class QueryParamFilterBackend(filters.DjangoFilterBackend):
+    """
+    DjangoFilterBackend that steps aside when the request has none of the filterset's parameters.
+
+    Unfiltered list requests (the common case) skip building and validating the filterset form.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filterset_class = self.get_filterset_class(view, queryset)
+        if filterset_class is None or request.query_params.keys().isdisjoint(filterset_class.base_filters):
+            return queryset
+        return super().filter_queryset(request, queryset, view)
+
+
+# Columns covered by the listing_search_ft FULLTEXT index (migration 0011)
+LISTING_FULLTEXT_COLUMNS = ('name', 'description', 'city', 'county')
+
+# InnoDB's default innodb_ft_min_token_size, shorter words are not in the index
+FULLTEXT_MIN_TOKEN_SIZE = 3
+
+# Characters with a meaning in MySQL boolean mode full-text queries
+_FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def _fulltext_terms(terms):
+    """
+    Strip boolean mode operators from the terms, or return None when the FULLTEXT index
+    can't serve them (not MySQL, no terms, or a term shorter than the index's minimum).
+    """
+    terms = [_FULLTEXT_OPERATORS.sub('', term) for term in terms]
+    if connection.vendor != 'mysql' or not terms or any(len(term) < FULLTEXT_MIN_TOKEN_SIZE for term in terms):
+        return None
+    return terms
+
+
+def _fulltext_match(queryset, terms, alias='search_match'):
+    """
+    Keep the listings with a word starting with each of the terms, through the listing_search_ft index.
+    """
+    table = connection.ops.quote_name(Listing._meta.db_table)
+    columns = ', '.join(f"{table}.{connection.ops.quote_name(column)}" for column in LISTING_FULLTEXT_COLUMNS)
+    match = RawSQL(
+        f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)",
+        (' '.join(f'+{term}*' for term in terms),),
+        output_field=FloatField(),
+    )
+    return queryset.alias(**{alias: match}).filter(**{f'{alias}__gt': 0})
+
+
+class ListingSearchFilter(SearchFilter):
+    """
+    ?search= on listings through the MySQL FULLTEXT index.
+
+    SearchFilter adds one OR of LIKE '%term%' scans per search term. Here every term
+    becomes a required prefix match in a single MATCH ... AGAINST lookup instead.
+    Falls back to SearchFilter on other databases (sqlite in tests) and for terms
+    too short to be in the index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = _fulltext_terms(self.get_search_terms(request))
+        if terms is None:
+            return super().filter_queryset(request, queryset, view)
+        return _fulltext_match(queryset, terms)
+
+
 class ListingFilter(filters.FilterSet):
     """
     Advanced filtering for listings.
@@ -25,22 +124,23 @@ class ListingFilter(filters.FilterSet):
     max_price = filters.NumberFilter(field_name='price_per_night', lookup_expr='lte')
     
     # Property specification filters
-    min_bedrooms = filters.NumberFilter(field_name='bedrooms', lookup_expr='gte')
-    min_bathrooms = filters.NumberFilter(field_name='bathrooms', lookup_expr='gte')
+    min_bedrooms = filters.NumberFilter(field_name='bedroom', lookup_expr='gte')
+    min_bathrooms = filters.NumberFilter(field_name='bathroom', lookup_expr='gte')
     min_guests = filters.NumberFilter(field_name='max_guests', lookup_expr='gte')
+    max_guests = filters.NumberFilter(field_name='max_guests', lookup_expr='gte')  # Older name for min_guests
     
-    # Location filters
+    # Location filters, a plain contains so a substring anywhere in the name matches
     city = filters.CharFilter(field_name='city', lookup_expr='icontains')
     county = filters.CharFilter(field_name='county', lookup_expr='icontains')
     
     # Property type filters
-    property_type = filters.MultipleChoiceFilter(
-        choices=Listing.PROPERTY_TYPE_CHOICES,
+    property_type = ChoiceInFilter(
+        valid_choices=_PROPERTY_TYPES,
         field_name='property_type'
     )
     
-    room_type = filters.MultipleChoiceFilter(
-        choices=Listing.ROOM_TYPE_CHOICES,
+    room_type = ChoiceInFilter(
+        valid_choices=_ROOM_TYPES,
         field_name='room_type'
     )
     
@@ -53,7 +153,7 @@ class ListingFilter(filters.FilterSet):
         fields = [
             'property_type', 'room_type', 'status',
             'min_price', 'max_price', 
-            'min_bedrooms', 'min_bathrooms', 'min_guests',
+            'min_bedrooms', 'min_bathrooms', 'min_guests', 'max_guests',
             'city', 'county'
         ]
     
@@ -62,18 +162,18 @@ class ListingFilter(filters.FilterSet):
         Filter listings available from a specific date.
         """
         # Exclude listings with confirmed bookings that overlap with the requested period
-        from django.db.models import Q
-        
         if value:
-            # Find listings with conflicting bookings
+            # Correlated subquery so the database does an anti-join instead of
+            # shipping the conflicting ids to Python and back
             conflicting_bookings = Booking.objects.filter(
+                listing=OuterRef('pk'),
                 status__in=['pending', 'confirmed'],
                 start_date__lte=value,
                 end_date__gt=value
-            ).values_list('property_id', flat=True)
+            )
             
             # Exclude listings with conflicting bookings
-            queryset = queryset.exclude(property_id__in=conflicting_bookings)
+            queryset = queryset.filter(~Exists(conflicting_bookings))
         
         return queryset
     
@@ -81,18 +181,17 @@ class ListingFilter(filters.FilterSet):
         """
         Filter listings available until a specific date.
         """
-        from django.db.models import Q
-        
         if value:
             # Find listings with conflicting bookings
             conflicting_bookings = Booking.objects.filter(
+                listing=OuterRef('pk'),
                 status__in=['pending', 'confirmed'],
                 start_date__lt=value,
                 end_date__gte=value
-            ).values_list('property_id', flat=True)
+            )
             
             # Exclude listings with conflicting bookings
-            queryset = queryset.exclude(property_id__in=conflicting_bookings)
+            queryset = queryset.filter(~Exists(conflicting_bookings))
         
         return queryset
 
@@ -10,12 +10,16 @@ Usage: Python manage.py seed
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 import random
 from datetime import date
 
+import numpy as np
+
 
 
 from listings.models import UserProfile, Listing, Booking,Review
@@ -45,18 +49,29 @@ class Command(BaseCommand):
 
         )
 
-        if options['clear']:
-            self.clear_data()
+        # One transaction for the whole run so the inserts share a single commit
+        with transaction.atomic():
+            if options['clear']:
+                self.clear_data()
 
             self.create_users()
             self.create_listings(options['count'])
             self.create_bookings()
             self.create_reviews()
 
-            self.stdout.write(
-                self.style.SUCCESS('Databse seeding completed successfully!')
+        self.stdout.write(
+            self.style.SUCCESS('Databse seeding completed successfully!')
 
-            )
+        )
+
+    def clear_data(self):
+        """Delete previously seeded data"""
+        self.stdout.write('Clearing existing data...')
+        Review.objects.all().delete()
+        Booking.objects.all().delete()
+        Listing.objects.all().delete()
+        UserProfile.objects.all().delete()
+        User.objects.filter(is_superuser = False).delete()
 
 
     def create_users(self):
@@ -107,23 +122,32 @@ class Command(BaseCommand):
             }
         ]
 
-        for user_data in users_data:
-            # Create Django User instance
-            user = User.objects.create_user(
+        # All sample users share a password so hash it once instead of per user
+        password = make_password("testpass123")
+        User.objects.bulk_create([
+            User(
                 username = user_data['username'],
                 email = user_data['email'],
-                password = "testpass123",
+                password = password,
                 first_name = user_data['first_name'],
                 last_name = user_data['last_name']
             )
+            for user_data in users_data
+        ])
+
+        # MySQL does not return primary keys from bulk_create, so fetch the users back in one query
+        users = User.objects.in_bulk([d['username'] for d in users_data], field_name = 'username')
 
-            # Create user profile
-            UserProfile.objects.create(
-                user = user,
+        # Create user profiles
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                linked_user = users[user_data['username']],
                 phone_number = user_data['phone'],
                 role = user_data['role'],
-                email_verified = True if user_data['role'] == 'admin' else False
+                email_verified = (user_data['role'] == 'admin')
             )
+            for user_data in users_data
+        ])
         self.stdout.write(
             self.style.SUCCESS(f"Created {len(users_data)} users")
         )
@@ -131,10 +155,10 @@ class Command(BaseCommand):
 
     def create_listings(self, count):
         """ Create sammple property listings"""
-        self.std.write(f"Creating {count} sample listings ....")
+        self.stdout.write(f"Creating {count} sample listings ....")
 
-        # GET HOST USERS
-        hosts = UserProfile.objects.filter(role = 'host')
+        # GET HOST USERS (evaluated once, random.choice on a queryset queries per call)
+        hosts = list(UserProfile.objects.filter(role = 'host'))
 
         #Sample listting data
         property_types = ['apartment', 'house', 'cottage', 'villa', 'condo', 'cabin']
@@ -152,27 +176,50 @@ class Command(BaseCommand):
             'Downtown Studio', 'Countryside Retreat'
         ]
 
-        for i in range(count):
-            host = random.choice(hosts)
-            listing = Listing.objects.create(
-                host = host,
-                name = f"{random.choice(property_names)} {i+1}",
-                description = f"Beautiful {random.choice(property_types)} in {random.choice(cities)}"
+        county_labels = ['county', 'District', 'Region']
+
+        # Draw every random column for all listings up front, one NumPy call per column
+        rng = np.random.default_rng()
+        host_idx = rng.integers(0, len(hosts), count).tolist()
+        name_idx = rng.integers(0, len(property_names), count).tolist()
+        desc_type_idx = rng.integers(0, len(property_types), count).tolist()
+        desc_city_idx = rng.integers(0, len(cities), count).tolist()
+        type_idx = rng.integers(0, len(property_types), count).tolist()
+        room_idx = rng.integers(0, len(room_types), count).tolist()
+        city_idx = rng.integers(0, len(cities), count).tolist()
+        county_idx = rng.integers(0, len(county_labels), count).tolist()
+        lats = rng.uniform(25.0, 50.0, count).round(6).tolist()
+        lons = rng.uniform(-125.0, -70.0, count).round(6).tolist()
+        bedrooms = rng.integers(1, 6, count).tolist()
+        bathrooms = rng.integers(1, 4, count).tolist()
+        max_guests = rng.integers(1, 9, count).tolist()
+        prices = rng.integers(2000, 20001, count).tolist()
+
+        listings = [
+            Listing(
+                host = hosts[host_idx[i]],
+                name = f"{property_names[name_idx[i]]} {i+1}",
+                description = f"Beautiful {property_types[desc_type_idx[i]]} in {cities[desc_city_idx[i]]}"
                               f" Perfect for travellers seeking comfort and convinence"
                             f" THis property offers modern amenities and a great location",
 
-            property_type = random.choice(property_types),
-            room_type = random.choice(room_types),
-            city = random.choice(cities),
-            county = f" {random.choice(['county', 'District', 'Region'])} {i + 1}",
-            latitude = Decimal (str(round(random.uniform(25.0, 50.0), 6))),
-            longitude = Decimal(str(round(random.uniform(-125.0, -70.0), 6))),
-            bedrooms = random.randint(1,5),
-            bathrooms = random.randint(1,3),
-            max_guests = random.randint(1,8),
-            price_per_night = Decimal(str(random.randint(2000, 20000))),
+            property_type = property_types[type_idx[i]],
+            room_type = room_types[room_idx[i]],
+            city = cities[city_idx[i]],
+            county = f" {county_labels[county_idx[i]]} {i + 1}",
+            latitude = Decimal(str(lats[i])),
+            longitude = Decimal(str(lons[i])),
+            bedroom = bedrooms[i],
+            bathroom = bathrooms[i],
+            max_guests = max_guests[i],
+            price_per_night = Decimal(prices[i]),
             status = 'approved',
             )
+            for i in range(count)
+        ]
+
+        # Insert in batches instead of one round-trip per listing
+        Listing.objects.bulk_create(listings, batch_size = 500)
         self.stdout.write(
             self.style.SUCCESS(F"Created  {count} listings")
         )
@@ -180,46 +227,51 @@ class Command(BaseCommand):
         """Create sample bookings"""
         self.stdout.write("Creating sample bookings")
 
-        # Get the guests and listings
-        guests = UserProfile.objects.filter(role = 'guest')
-        listings = Listing.objects.filter(status = "approved")
+        # Get the guests and listings, evaluated once and trimmed to the columns we use
+        guests = list(UserProfile.objects.filter(role = 'guest'))
+        listings = list(Listing.objects.filter(status = "approved").only('property_id', 'price_per_night', 'max_guests'))
 
-        booking_count = 0
+        bookings = []
+        booking_total = 30
 
-        for _ in range(30):
-            guest = random.choice(guests)
-            listing = random.choice(listings)
+        # Draw all the random picks in one call each instead of one call per booking
+        guest_picks = random.choices(guests, k = booking_total)
+        listing_picks = random.choices(listings, k = booking_total)
+        start_offsets = random.choices(range(-30, 61), k = booking_total)
+        durations = random.choices(range(1, 15), k = booking_total)
 
+        for guest, listing, start_offset, duration in zip(guest_picks, listing_picks, start_offsets, durations):
             # Generate the random dates
-            start_date = date.today() + timedelta(days = random.randint(-30, 60))
-            duration = random.randint(1,14)
+            start_date = date.today() + timedelta(days = start_offset)
             end_date = start_date + timedelta(days = duration)
 
-            # Calculate the total price
+            # Calculate the total price. This stays in Python: a GeneratedField can't read
+            # the listing's price across the foreign key, and the price is already loaded above
             total_price = listing.price_per_night * duration
 
             # Random status based on the date
             if end_date < date.today():
-                status = random.choice(['completed', 'cancelled'])
+                status = random.choice(['completed', 'canceled'])
             elif start_date <= date.today():
                 status = 'confirmed'
             else:
                 status = random.choice(['pending', 'confirmed'])
 
 
-            booking = Booking.objects.create(
-                property = listing,
+            bookings.append(Booking(
+                listing = listing,
                 user = guest,
                 start_date = start_date,
-                guests_count = random.randint(1, min(listing.max_guests, 4)),
+                end_date = end_date,
+                guests = random.randint(1, min(listing.max_guests, 4)),
                 total_price = total_price,
                 status = status
-            )
+            ))
 
-            booking_count += 1
+        Booking.objects.bulk_create(bookings)
 
         self.stdout.write(
-            self.style.SUCCESS (f" Created {booking_count} bookings")
+            self.style.SUCCESS (f" Created {len(bookings)} bookings")
         )
 
     def create_reviews(self):
@@ -227,10 +279,10 @@ class Command(BaseCommand):
         self.stdout.write("Creating sample reviews")
 
         #Get completed bookinggs that can be reviewed
-        completed_bookings = Booking.objects.filter(
+        completed_bookings = list(Booking.objects.filter(
             status = 'completed',
             end_date__lt = date.today()
-        )
+        ))
 
         # Sample reviw comments 
         positive_comments = [
@@ -248,34 +300,40 @@ class Command(BaseCommand):
             "Location was noisy and not as convenient as advertised."
         ]
 
-        review_count = 0
+        reviews = []
+        response_date = timezone.now()
 
+        # Ratings for every candidate booking in a single draw
+        ratings = random.choices(range(1, 6), k = len(completed_bookings))
 
         # Create reviews for about 70 % of completed bookings
-        for booking in completed_bookings:
+        for booking, rating in zip(completed_bookings, ratings):
             if random.random() < 0.7:
-                rating = random.randint(1,5)
-
                 if rating >=4:
                     comment = random.choice(positive_comments)
                 else:
                     comment = random.choice(negative_comments)
 
-                review = Review.objects.create(
+                # Use the raw ids so no extra query is made for the related rows
+                review_fields = dict(
                     booking = booking,
-                    user = booking.user,
-                    property = booking.property,
+                    user_id = booking.user_id,
+                    listing_id = booking.listing_id,
                     rating = rating,
                     comment = comment
                 )
 
-                #Add host responses for some reviews
+                #Add host responses for some reviews, set up front so each review is a single INSERT
                 if random.random() < 0.6:
-                    review.host_response = "Thank you for your review! We are glad you enjoyed your stay."
-                    review.host_response_date = timezone.now()
-                    review.save()
-
-                review_count += 1
-            self.stdout.write(
-                self.style.SUCCESS(f"Created {review_count} reviews")
-            )
\ No newline at end of file
+                    review_fields['host_response'] = "Thank you for your review! We are glad you enjoyed your stay."
+                    review_fields['host_response_date'] = response_date
+
+                reviews.append(Review(**review_fields))
+
+        Review.objects.bulk_create(reviews)
+        # bulk_create skips the post_save that keeps the listing rating stats current
+        Listing.objects.filter(pk__in = {review.listing_id for review in reviews}).refresh_rating_stats()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {len(reviews)} reviews")
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_alter_listing_latitude_alter_listing_longitude'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'status', 'start_date', 'end_date'], name='bookings_listing_3aa373_idx'),
+        ),
+    ]
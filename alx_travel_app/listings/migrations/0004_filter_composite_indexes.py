@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_booking_listing_status_dates_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'start_date', 'end_date'], name='bookings_status_f01a75_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['status', 'city', 'price_per_night'], name='listings_status_aca210_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['property_type', 'price_per_night'], name='listings_propert_f20be6_idx'),
+        ),
+    ]
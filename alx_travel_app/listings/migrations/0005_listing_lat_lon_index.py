@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_filter_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['latitude', 'longitude'], name='listings_latitud_071b4f_idx'),
+        ),
+    ]
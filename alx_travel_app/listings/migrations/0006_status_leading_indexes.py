@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_lat_lon_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'end_date'], name='booking_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['status', '-created_at'], name='listing_status_created_idx'),
+        ),
+    ]
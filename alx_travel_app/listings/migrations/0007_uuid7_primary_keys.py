@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:22
+
+import listings.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_status_leading_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.UUIDField(default=listings.utils.uuid7, editable=False, help_text=' Unique identifier for booking', primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='property_id',
+            field=models.UUIDField(default=listings.utils.uuid7, help_text='Unique Identifier for property', primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='review_id',
+            field=models.UUIDField(default=listings.utils.uuid7, editable=False, help_text=' Unique identifier for the review', primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='user_id',
+            field=models.UUIDField(default=listings.utils.uuid7, editable=False, help_text='Unique Identifier for the user', primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.2 on 2026-10-15 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Day the snapshot was taken', unique=True)),
+                ('total_bookings', models.PositiveIntegerField(default=0)),
+                ('confirmed_bookings', models.PositiveIntegerField(default=0)),
+                ('completed_bookings', models.PositiveIntegerField(default=0)),
+                ('total_listings', models.PositiveIntegerField(default=0)),
+                ('active_listings', models.PositiveIntegerField(default=0)),
+                ('total_reviews', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(default=0)),
+                ('rating_distribution', models.JSONField(default=dict, help_text='Number of reviews per star rating')),
+                ('processed_at', models.DateTimeField(auto_now=True, help_text='When the snapshot was last computed')),
+            ],
+            options={
+                'verbose_name': 'Analytics Snapshot',
+                'verbose_name_plural': 'Analytics Snapshots',
+                'db_table': 'analytics_snapshots',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Users created before the create_user_profile signal may not have a profile yet
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('listings', 'UserProfile')
+    missing = User.objects.filter(userprofile__isnull=True)
+    UserProfile.objects.bulk_create(
+        [UserProfile(linked_user=user, role='guest') for user in missing.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_booking_created_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
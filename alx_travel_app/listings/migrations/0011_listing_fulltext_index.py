@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+# MySQL only, other backends (sqlite in tests) fall back to SearchFilter's LIKE lookups
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX listing_search_ft ON listings (name, description, city, county)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX listing_search_ft ON listings')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_backfill_user_profiles'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
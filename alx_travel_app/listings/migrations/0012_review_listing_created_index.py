@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-15 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listing_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', '-created_at'], name='review_listing_created_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_stats(apps, schema_editor):
+    # Same UPDATE as ListingQuerySet.refresh_rating_stats, for the listings that already have reviews
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    Listing.objects.filter(reviews__isnull=False).distinct().update(
+        avg_rating=Coalesce(Subquery(reviews.annotate(avg=Avg('rating')).values('avg')), 0.0, output_field=FloatField()),
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count('pk')).values('count')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_review_listing_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.FloatField(default=0, help_text='Average review rating'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of reviews'),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
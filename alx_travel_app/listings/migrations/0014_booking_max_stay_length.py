@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-15 07:40
+
+import datetime
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_listing_rating_stats'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.CheckConstraint(condition=models.Q(('end_date__lte', django.db.models.expressions.CombinedExpression(models.F('start_date'), '+', models.Value(datetime.timedelta(days=365))))), name='max_stay_length'),
+        ),
+    ]
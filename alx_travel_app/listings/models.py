@@ -1,17 +1,49 @@
-import uuid
-from django.db import models
+from .utils import uuid7
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+import math
+import operator
+import time
+from functools import reduce
+from functools import cached_property
+from datetime import timedelta
 from decimal import Decimal
 from django.core.exceptions import ValidationError
+from django.db.models import Avg, BooleanField, Count, ExpressionWrapper, FloatField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce, Now
 
 
 """
 This file defines the core data strctures for each class and represets a database table with the fields.
 The models include UserProfile, Listing, Booking, Review
+
+All four models keep their UUID primary keys. Moving to BigAutoField with a separate public UUID
+would rewrite every foreign key column and needs a data migration that remaps existing rows,
+so insert locality is handled by the UUID default instead.
 """
 
+# auth_user columns none of the serializers render (the password hash is the widest of them).
+# Deferred wherever the user is joined in, so list pages don't carry them for every row
+UNRENDERED_USER_FIELDS = ('password', 'last_login', 'is_superuser', 'is_staff', 'is_active', 'date_joined')
+
+
+def _unrendered_user_fields(path):
+    return [f'{path}__{field}' for field in UNRENDERED_USER_FIELDS]
+
+
+class UserProfileQuerySet(models.QuerySet):
+    """ Reusable query recipes for user profiles"""
+
+    def optimized(self):
+        # UserProfileSerializer renders the linked user's name and email, join it without the auth columns
+        return self.select_related('linked_user').defer(*_unrendered_user_fields('linked_user'))
+
+
 class UserProfile(models.Model):
     """
     THis extends the default django user model profile to include additional fields
@@ -25,7 +57,7 @@ class UserProfile(models.Model):
     ]
 
     #Primary key using UUID for security purposes
-    user_id = models.UUIDField(primary_key =True, default = uuid.uuid4, editable=False, help_text = "Unique Identifier for the user")
+    user_id = models.UUIDField(primary_key =True, default = uuid7, editable=False, help_text = "Unique Identifier for the user")
     linked_user = models.OneToOneField(User, on_delete = models.CASCADE, help_text = "Link to Django built-in user identification")
     phone_number = models.CharField(max_length = 15, blank = True, null = True, help_text = "Use's phone number")
     profile_picture = models.ImageField(upload_to = 'profile_pics/', blank = True, null = True, help_text = "Use's Profile picture")
@@ -34,6 +66,8 @@ class UserProfile(models.Model):
     created_at  = models.DateTimeField(auto_now_add = True, help_text = "When the user's profile was created")
     last_login = models.DateTimeField(auto_now_add = True, help_text = 'Last time user logged in')
 
+    objects = UserProfileQuerySet.as_manager()
+
     class Meta:
         db_table = 'user_profile'
         verbose_name = 'User Profile'
@@ -62,6 +96,33 @@ class UserProfile(models.Model):
 
 
 
+class ListingQuerySet(models.QuerySet):
+    """ Reusable query recipes for listings"""
+
+    def refresh_rating_stats(self):
+        # Recompute the stored rating average and review count of these listings in a single UPDATE.
+        # Called when reviews change, so reading a listing never has to aggregate its reviews
+        reviews = Review.objects.filter(listing = OuterRef('pk')).order_by().values('listing')
+        return self.update(
+            avg_rating = Coalesce(Subquery(reviews.annotate(avg = Avg('rating')).values('avg')), 0.0, output_field = FloatField()),
+            review_count = Coalesce(Subquery(reviews.annotate(count = Count('pk')).values('count')), 0),
+        )
+
+    def optimized(self):
+        # The serializers render the host profile and its linked user, join them in the same query
+        return self.select_related('host__linked_user').defer(*_unrendered_user_fields('host__linked_user'))
+
+    def near(self, latitude, longitude, radius_km):
+        # Bounding box around the point so the (latitude, longitude) index can prune the rows.
+        # A degree of latitude is ~111 km, a degree of longitude shrinks with cos(latitude)
+        lat_delta = radius_km / 111.0
+        lon_delta = radius_km / (111.0 * max(math.cos(math.radians(latitude)), 0.01))
+        return self.filter(
+            latitude__range = (Decimal(str(latitude - lat_delta)), Decimal(str(latitude + lat_delta))),
+            longitude__range = (Decimal(str(longitude - lon_delta)), Decimal(str(longitude + lon_delta))),
+        )
+
+
 class Listing(models.Model):
     """
     This models h=shows the property/accommodation that hosts offer
@@ -100,7 +161,7 @@ class Listing(models.Model):
 
 
     # Primary key using UUID for security purposes
-    property_id = models.UUIDField(primary_key = True, default =  uuid.uuid4, help_text = "Unique Identifier for property")
+    property_id = models.UUIDField(primary_key = True, default = uuid7, help_text = "Unique Identifier for property")
     host = models.ForeignKey(UserProfile, on_delete = models.CASCADE, related_name = 'listings')
     name = models.CharField(max_length = 100, help_text = 'Name of the property')
     description = models.TextField(help_text = "Detailed description of the property")
@@ -126,6 +187,11 @@ class Listing(models.Model):
     status = models.CharField(max_length= 220, choices= STATUS_CHOICES, default = "pending", help_text = " Approval status of the lsiting")
     created_at = models.DateTimeField(auto_now_add = True, help_text = "When the listing was created")
     updated_at = models.DateTimeField(auto_now_add = True, help_text = "When the listing was updated")
+    # Rating stats kept up to date from the reviews (see update_listing_rating_stats)
+    avg_rating = models.FloatField(default = 0, help_text = "Average review rating")
+    review_count = models.PositiveIntegerField(default = 0, help_text = "Number of reviews")
+
+    objects = ListingQuerySet.as_manager()
 
 
     class Meta:
@@ -137,10 +203,20 @@ class Listing(models.Model):
             models.Index(fields = ['city','county']), #For location-based queries"
             models.Index(fields =['property_type']), #For filtering
             models.Index(fields=['price_per_night']),  # For price sorting
+            models.Index(fields=['status', 'city', 'price_per_night']), # Approved listings filtered by city and price
+            models.Index(fields=['property_type', 'price_per_night']), # Property type filter with a price range
+            models.Index(fields=['latitude', 'longitude']), # Radius searches through near()
+            models.Index(fields=['status', '-created_at'], name='listing_status_created_idx'), # Approved listings, newest first
         ]
 
     def __str__(self):
         return f"{self.name} in {self.city}"
+
+    @classmethod
+    def bulk_from_dicts(cls, rows, batch_size = 500, ignore_conflicts = True):
+        # Import path: one batched INSERT per batch_size rows instead of one create() per row
+        with transaction.atomic():
+            return cls.objects.bulk_create([cls(**row) for row in rows], batch_size = batch_size, ignore_conflicts = ignore_conflicts)
     
     @property
     def is_available(self):
@@ -148,16 +224,76 @@ class Listing(models.Model):
     
     @property
     def average_rating(self):
-        # Calculate the average rating from reviews
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
-    
-    @property
-    def review_count(self):
-        # Get the total number of reviws
-        return self.reviews.count()
+        # Stored on the row, see avg_rating
+        return self.avg_rating
+
+
+class BookingQuerySet(models.QuerySet):
+    """ Reusable query recipes for bookings"""
+
+    def optimized(self):
+        # Everything the booking serializer renders: the guest, and the listing with its host.
+        # The listing is prefetched, one extra query for the whole page
+        return self.with_active_flag().select_related('user__linked_user').defer(
+            *_unrendered_user_fields('user__linked_user')
+        ).prefetch_related(
+            Prefetch('listing', queryset = Listing.objects.optimized())
+        )
+
+    @staticmethod
+    def overlap_q(listing, start_date, end_date):
+        # Stays on listing that share a night with [start_date, end_date), whatever their status.
+        # No stay is longer than MAX_STAY_NIGHTS (the max_stay_length constraint), so one overlapping it
+        # starts at most that long before start_date. The lower bound turns the start_date < end_date
+        # scan over the listing's whole history into a bounded range on the
+        # (listing, status, start_date, end_date) index
+        return Q(
+            listing = listing,
+            start_date__gt = start_date - timedelta(days = Booking.MAX_STAY_NIGHTS),
+            start_date__lt = end_date,
+            end_date__gt = start_date,
+        )
+
+    def overlapping(self, listing, start_date, end_date):
+        # Bookings that hold the listing for part of [start_date, end_date)
+        return self.filter(self.overlap_q(listing, start_date, end_date), status__in = Booking.BLOCKING_STATUSES)
+
+    def batch_overlaps(self, bookings):
+        """
+        True if any of the unsaved bookings shares a night with another one of the batch, or with
+        a stay already holding its listing (one query). Run it with the listings locked.
+        """
+        blocking = [booking for booking in bookings if booking.status in Booking.BLOCKING_STATUSES]
+        if not blocking:
+            return False
+        previous = None
+        for booking in sorted(blocking, key = lambda b: (b.listing_id, b.start_date)):
+            if previous and previous.listing_id == booking.listing_id and booking.start_date < previous.end_date:
+                return True
+            previous = booking
+        return self.filter(
+            reduce(operator.or_, (
+                self.overlap_q(booking.listing_id, booking.start_date, booking.end_date) for booking in blocking
+            )),
+            status__in = Booking.BLOCKING_STATUSES,
+        ).exists()
+
+    def with_active_flag(self):
+        # is_active and can_be_reviewed worked out by the database alongside the row
+        return self.annotate(
+            is_active_db = ExpressionWrapper(
+                Q(status = 'confirmed', start_date__lte = Now(), end_date__gte = Now()),
+                output_field = BooleanField()
+            ),
+            can_be_reviewed_db = ExpressionWrapper(
+                Q(status = 'completed', end_date__lt = Now()),
+                output_field = BooleanField()
+            ),
+        )
+
+
+# Module level so Booking.Meta's check constraint can read it
+MAX_STAY_NIGHTS = 365
 
 
 class Booking(models.Model):
@@ -174,8 +310,14 @@ class Booking(models.Model):
                       ('completed', 'Completed'),
                       ]
 
+    # Statuses that keep the dates blocked for other guests
+    BLOCKING_STATUSES = ['pending', 'confirmed']
+    # Longest stay that can be booked, bounds the overlap checks (see BookingQuerySet.overlap_q).
+    # Enforced by the max_stay_length check constraint, so no write path can store a longer stay
+    MAX_STAY_NIGHTS = MAX_STAY_NIGHTS
+
     # Primary key using UUID
-    booking_id = models.UUIDField(primary_key = True, default = uuid.uuid4,  help_text = " Unique identifier for booking" ,editable = False)
+    booking_id = models.UUIDField(primary_key = True, default = uuid7,  help_text = " Unique identifier for booking" ,editable = False)
     listing = models.ForeignKey(Listing, on_delete = models.CASCADE, related_name = 'bookings', help_text = "The property being booked")
     user = models.ForeignKey(UserProfile, on_delete = models.CASCADE, help_text = 'The guest making the booking')
     start_date = models.DateTimeField(help_text = 'Check in date')
@@ -190,6 +332,8 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add = True, help_text = " When the booking was created")
     updated_at = models.DateTimeField(auto_now_add  = True, help_text = "When the booking was last updated")
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         db_table = 'bookings'
         verbose_name = "Booking"
@@ -198,6 +342,11 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields = ['start_date', 'end_date']),
             models.Index(fields=['status']),
+            models.Index(fields=['listing', 'status', 'start_date', 'end_date']), # For the availability filters
+            models.Index(fields=['status', 'start_date', 'end_date']), # BookingFilter status + date range lookups
+            models.Index(fields=['status', 'end_date'], name='booking_status_end_idx'), # Completed stays that can be reviewed
+            models.Index(fields=['user', '-created_at'], name='booking_user_created_idx'), # A guest's bookings, newest first (cursor pagination)
+            models.Index(fields=['-created_at'], name='booking_created_idx'), # Admin and host booking pages, newest first
         ]
         constraints = [
             # Ensure that the end date is after the start date
@@ -205,39 +354,109 @@ class Booking(models.Model):
                 check = models.Q(end_date__gt= models.F('start_date')),
                 name = 'Valid_date_range'
             ),
+            # The overlap checks only look MAX_STAY_NIGHTS back from a stay's start
+            models.CheckConstraint(
+                condition = models.Q(end_date__lte = models.F('start_date') + timedelta(days = MAX_STAY_NIGHTS)),
+                name = 'max_stay_length'
+            ),
         ]
     def __str__(self):
         return f"Booking {self.booking_id} - {self.property.name}"
+
+    @classmethod
+    def bulk_from_dicts(cls, rows, batch_size = 500, ignore_conflicts = True):
+        # Batched import of bookings. The listings involved are locked first (in pk order, so two
+        # imports can't deadlock) so a concurrent booking can't slip in between the availability
+        # check and the insert
+        bookings = [cls(**row) for row in rows]
+        # Also a check constraint, caught here so MySQL versions that don't enforce CHECK can't store one
+        for booking in bookings:
+            if booking.end_date - booking.start_date > timedelta(days = cls.MAX_STAY_NIGHTS):
+                raise ValidationError(f"Stays cannot be longer than {cls.MAX_STAY_NIGHTS} nights")
+        with transaction.atomic():
+            list(Listing.objects.select_for_update().filter(
+                property_id__in = {booking.listing_id for booking in bookings}
+            ).order_by('pk').values_list('pk', flat = True))
+            if cls.objects.batch_overlaps(bookings):
+                raise ValidationError("The property is already booked for these dates")
+            created = cls.objects.bulk_create(bookings, batch_size = batch_size, ignore_conflicts = ignore_conflicts)
+        # bulk_create sends no post_save, the availability filters on cached pages change
+        bump_listing_cache_version(cls)
+        return created
     
-    @property
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.clear_active_flags()
+
+    def clear_active_flags(self):
+        # The with_active_flag() annotations describe the row as it was loaded, drop them so
+        # is_active and can_be_reviewed follow a status change made on this instance
+        self.__dict__.pop('is_active_db', None)
+        self.__dict__.pop('can_be_reviewed_db', None)
+
+    def transition(self, new_status, allowed_from):
+        """
+        Move the booking to new_status with a single conditional UPDATE of the status column.
+        Returns False, leaving the instance untouched, if the row is no longer in one of the
+        allowed_from statuses (e.g. a concurrent confirm and cancel)
+        """
+        # update() skips the field defaults, so stamp updated_at here along with the status
+        now = timezone.now()
+        updated = Booking.objects.filter(pk = self.pk, status__in = allowed_from).update(status = new_status, updated_at = now)
+        if updated:
+            self.status = new_status
+            self.updated_at = now
+            self.clear_active_flags()
+            # update() sends no post_save, and a cancellation frees the dates in the availability filters
+            bump_listing_cache_version(Booking)
+        return bool(updated)
+
+    @cached_property
     def duration_nights(self):
+        # Cached since the serializer and the emails read it several times per booking
         return (self.end_date - self.start_date).days
     
     @property
     def is_active(self):
-        # Check if the current booking is active
-        today = timezone.now().date()
-        return (self.status == 'confirmed' and self.start_date  <=today <= self.end_date)        
+        # Check if the current booking is active, using the with_active_flag() annotation when present
+        if hasattr(self, 'is_active_db'):
+            return self.is_active_db
+        now = timezone.now()
+        return (self.status == 'confirmed' and self.start_date  <=now <= self.end_date)        
     
     @property
     def can_be_reviewed(self):
         # Check if the booking can be reviewed( this applies for completed stays only)
-        return (self.status == 'completed' and self.end_date < timezone.now().date())
+        if hasattr(self, 'can_be_reviewed_db'):
+            return self.can_be_reviewed_db
+        return (self.status == 'completed' and self.end_date < timezone.now())
     
     def clean(self):
-        # Custom validation to ensure that that booking dates are in the future
-        if self.start_date and self.end_date:
-            if self.end_date <= self.start_date:
-                raise ValidationError("End data must always be after the start date")
-            
-            #Checking if the start date is in the past
-            if self.start_date < timezone.now().date():
-                raise ValidationError("Start date can't be in the past")
+        # End after start and the MAX_STAY_NIGHTS limit are enforced by the Valid_date_range and
+        # max_stay_length check constraints, which full_clean() validates.
+        # Overlaps can't be a constraint on MySQL (no exclusion constraints), they are checked under a
+        # row lock on the listing when the booking is created, see BookingQuerySet.overlapping()
+
+        #Checking if the start date is in the past
+        if self.start_date and self.start_date < timezone.now():
+            raise ValidationError("Start date can't be in the past")
         
         # check if the guest count does not exceed the property maximum capacity
-        if self.guests_count and self.property:
-            if self.guests > self.property.max_guests:
-                raise ValidationError(f" Guest count ({self.guests}) exceeds property limit ({self.property.max_guests}) ")
+        if self.guests and self.listing_id:
+            if self.guests > self.listing.max_guests:
+                raise ValidationError(f" Guest count ({self.guests}) exceeds property limit ({self.listing.max_guests}) ")
+
+
+class ReviewQuerySet(models.QuerySet):
+    """ Reusable query recipes for reviews"""
+
+    def optimized(self):
+        # The review serializer renders the guest and the listing with its host
+        return self.select_related('user__linked_user').defer(
+            *_unrendered_user_fields('user__linked_user')
+        ).prefetch_related(
+            Prefetch('listing', queryset = Listing.objects.optimized())
+        )
 
 
 class Review(models.Model):
@@ -246,7 +465,7 @@ class Review(models.Model):
     it includes ratings, comments and host responses
     """
 
-    review_id = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False,  help_text = " Unique identifier for the review")
+    review_id = models.UUIDField(primary_key = True, default = uuid7, editable = False,  help_text = " Unique identifier for the review")
     booking = models.OneToOneField(Booking, on_delete = models.CASCADE, related_name = 'review', help_text = "The booking this review is for")
     listing = models.ForeignKey(Listing, on_delete = models.CASCADE, related_name = 'reviews' , help_text = "The property being reviewed")
     user = models.ForeignKey(UserProfile, on_delete = models.CASCADE, related_name= 'reviews_written', help_text = "The guest who wrote the review")
@@ -258,6 +477,8 @@ class Review(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True,help_text = "Whent the review was created")
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         db_table = 'reviews'
         verbose_name = 'Review'
@@ -265,12 +486,22 @@ class Review(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields = ['rating']),
-            models.Index(fields=['created_at'])
+            models.Index(fields=['created_at']),
+            models.Index(fields=['listing', '-created_at'], name='review_listing_created_idx'), # A listing's reviews, newest first (cursor pagination)
         ]
 
 
     def __str__(self):
         return f"Review by {self.linked_user.get_full_name()} - {self.rating} stars"
+
+    @classmethod
+    def bulk_from_dicts(cls, rows, batch_size = 500, ignore_conflicts = True):
+        # Batched import of reviews, one INSERT per batch_size rows
+        with transaction.atomic():
+            reviews = cls.objects.bulk_create([cls(**row) for row in rows], batch_size = batch_size, ignore_conflicts = ignore_conflicts)
+            # bulk_create sends no post_save, refresh the listings' rating stats here
+            Listing.objects.filter(pk__in = {review.listing_id for review in reviews}).refresh_rating_stats()
+            return reviews
     
     @property
     def has_host_response(self):
@@ -283,4 +514,68 @@ class Review(models.Model):
         
         if self.booking and self.property:
             if self.booking.property != self.property:
-                raise ValidationError("Review property must match the booking property")
\ No newline at end of file
+                raise ValidationError("Review property must match the booking property")
+
+
+class AnalyticsSnapshot(models.Model):
+    """
+    Daily booking analytics written by the process_booking_analytics task.
+    One row per day, re-running the task on the same day overwrites it
+    """
+
+    date = models.DateField(unique = True, help_text = "Day the snapshot was taken")
+    total_bookings = models.PositiveIntegerField(default = 0)
+    confirmed_bookings = models.PositiveIntegerField(default = 0)
+    completed_bookings = models.PositiveIntegerField(default = 0)
+    total_listings = models.PositiveIntegerField(default = 0)
+    active_listings = models.PositiveIntegerField(default = 0)
+    total_reviews = models.PositiveIntegerField(default = 0)
+    average_rating = models.FloatField(default = 0)
+    rating_distribution = models.JSONField(default = dict, help_text = "Number of reviews per star rating")
+    processed_at = models.DateTimeField(auto_now = True, help_text = "When the snapshot was last computed")
+
+    class Meta:
+        db_table = 'analytics_snapshots'
+        verbose_name = 'Analytics Snapshot'
+        verbose_name_plural = 'Analytics Snapshots'
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Analytics for {self.date}"
+
+
+
+@receiver(post_save, sender = User)
+def create_user_profile(sender, instance, created, raw = False, **kwargs):
+    # Every user has a profile from the moment it exists, so request code can look it up
+    # with a plain get instead of a get_or_create on the write path
+    if created and not raw:
+        UserProfile.objects.create(linked_user = instance, role = 'guest')
+
+
+@receiver([post_save, post_delete], sender = Review)
+def update_listing_rating_stats(sender, instance, raw = False, **kwargs):
+    # Keep the listing's stored rating stats in step with its reviews
+    if raw:
+        return
+    Listing.objects.filter(pk = instance.listing_id).refresh_rating_stats()
+    # The listing attached to the review is rendered again in the response
+    if Review.listing.is_cached(instance) and instance.listing is not None:
+        instance.listing.refresh_from_db(fields = ['avg_rating', 'review_count'])
+
+
+# Listing list and search pages are cached under a version token, replaced whenever a listing,
+# a review (rating stats) or a booking (available_from/available_to results) changes so cached
+# pages never outlive the rows they show
+LISTING_CACHE_VERSION_KEY = 'listings:version'
+
+
+def listing_cache_version():
+    return cache.get_or_set(LISTING_CACHE_VERSION_KEY, time.time_ns, timeout = None)
+
+
+@receiver([post_save, post_delete], sender = Listing)
+@receiver([post_save, post_delete], sender = Review)
+@receiver([post_save, post_delete], sender = Booking)
+def bump_listing_cache_version(sender, **kwargs):
+    cache.set(LISTING_CACHE_VERSION_KEY, time.time_ns(), timeout = None)
@@ -0,0 +1,37 @@
+"""
+Pagination classes for the listings API.
+"""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Newest first cursor pagination.
+
+    Each page is a range read on the created_at index instead of a COUNT(*)
+    plus a LIMIT/OFFSET that walks every skipped row, so deep pages cost the
+    same as the first one. Responses carry next/previous cursors but no count.
+    """
+
+    ordering = '-created_at'
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def get_ordering(self, request, queryset, view):
+        # The cursor holds the first ordering field's value plus an offset into the rows sharing it,
+        # so those rows need a fixed order or they repeat or go missing between pages.
+        # ?ordering= can pick non unique fields (price, name, rating), pk breaks the ties
+        ordering = super().get_ordering(request, queryset, view)
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not any(field.lstrip('-') in pk_names for field in ordering):
+            ordering += ('-pk' if ordering[0].startswith('-') else 'pk',)
+        return ordering
+
+
+class ReviewCursorPagination(CreatedAtCursorPagination):
+    """
+    Smaller pages for a listing's reviews, which carry long comments and a nested listing each.
+    """
+
+    page_size = 10
@@ -0,0 +1,31 @@
+"""
+Custom DRF renderers for the listings API.
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+def _orjson_default(obj):
+    # Only called for types orjson can't encode itself (UUID, datetime, dict/list are native):
+    # Decimals from hand built responses and lazy translation strings, both render as text
+    return str(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson.
+
+    UUIDs, datetimes and the serializers' dict/list subclasses are encoded in C
+    instead of going through the stdlib encoder's per-object Python callbacks.
+    Decimals keep DRF's string representation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS,
+        )
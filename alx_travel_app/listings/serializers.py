@@ -5,20 +5,32 @@ These serializers are used to convert between Django models instances and  JSON
 They hanle data validation, serialization and deserialization for our API
 """
 
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.functions import Left
 from rest_framework import serializers
-from .models import Listing, UserProfile, Review, Booking
+from .models import Listing, UserProfile, Review, Booking, bump_listing_cache_version
 from django.contrib.auth.models import User
 
+# Choice value -> label maps built once, get_FOO_display() rebuilds the lookup on every call
+PROPERTY_TYPE_MAP = dict(Listing.PROPERTY_TYPE_CHOICES)
+ROOM_TYPE_MAP = dict(Listing.ROOM_TYPE_CHOICES)
+LISTING_STATUS_MAP = dict(Listing.STATUS_CHOICES)
+BOOKING_STATUS_MAP = dict(Booking.STATUS_CHOICES)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """ Serializer the userprofile model
     This one handles the extended user information beyond django default user model
     """
 
     # Include user information for the related user model
-    username = serializers.CharField(source = 'user.username', read_only = True)
-    email = serializers.EmailField(source = 'user.email', read_only =True)
-    first_name = serializers.CharField(source = 'user.first_name', read_only = True)
-    last_name = serializers.CharField(source = 'user.last_name', read_only = True)
+    username = serializers.CharField(source = 'linked_user.username', read_only = True)
+    email = serializers.EmailField(source = 'linked_user.email', read_only =True)
+    first_name = serializers.CharField(source = 'linked_user.first_name', read_only = True)
+    last_name = serializers.CharField(source = 'linked_user.last_name', read_only = True)
     class Meta:
         model = UserProfile
         fields = [
@@ -30,6 +42,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['user_id', 'created_at']
 
 
+class HostMiniSerializer(serializers.Serializer):
+    """ Minimal host representation for list endpoints.
+    Skips the profile picture URL and the other user fields of UserProfileSerializer
+    """
+    user_id = serializers.UUIDField(read_only = True)
+    username = serializers.CharField(source = 'linked_user.username', read_only = True)
+
+
 class ListingSerializer(serializers.ModelSerializer):
     """ This is a serializer for the property listings model
     It handles the main property data including location, priciing and specifications
@@ -38,15 +58,15 @@ class ListingSerializer(serializers.ModelSerializer):
     # Include the host information from the UserProfile model
     host = UserProfileSerializer(read_only = True)
 
-    #Calculated fields
-    average_rating = serializers.ReadOnlyField()
-    review_count = serializers.ReadOnlyField()
+    #Calculated fields (rating stats are stored on the listing row)
+    average_rating = serializers.FloatField(read_only = True)
+    review_count = serializers.IntegerField(read_only = True)
     is_available = serializers.ReadOnlyField()
 
     # Display the choices as human-readble texts
-    property_type_display = serializers.CharField(source = 'get_property_type_display', read_only = True)
-    room_type_display = serializers.CharField(source = 'get_room_type_display', read_only =True)
-    status_display = serializers.CharField(source = 'get_status_display', read_only =True)
+    property_type_display = serializers.SerializerMethodField()
+    room_type_display = serializers.SerializerMethodField()
+    status_display = serializers.SerializerMethodField()
 
     class Meta:
         model = Listing
@@ -61,6 +81,15 @@ class ListingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['property_id', 'created_id', 'updated_at']
 
+    def get_property_type_display(self, obj):
+        return PROPERTY_TYPE_MAP.get(obj.property_type, obj.property_type)
+
+    def get_room_type_display(self, obj):
+        return ROOM_TYPE_MAP.get(obj.room_type, obj.room_type)
+
+    def get_status_display(self, obj):
+        return LISTING_STATUS_MAP.get(obj.status, obj.status)
+
     def validate_price_per_night(self, value):
         """ Custom validation for price_per_night_field"""
         if value <= 0:
@@ -76,17 +105,105 @@ class ListingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Max guests must be atleast 3")
         return data
     
+class ListingListSerializer(ListingSerializer):
+    """ Lighter listing serializer for the list endpoint.
+    Shortens the description and leaves out the address details and the full host profile
+    """
+
+    # Characters of the description shown on a listing card, cut by the database (see description_preview)
+    DESCRIPTION_PREVIEW_LENGTH = 200
+
+    # Just enough of the host to link to it
+    host = HostMiniSerializer(read_only = True)
+    # The card preview, from the description_preview annotation instead of the whole text column
+    description = serializers.CharField(source = 'description_preview', read_only = True)
+
+    class Meta(ListingSerializer.Meta):
+        fields = [
+             'property_id', 'host', 'name', 'description',
+             'property_type', 'room_type', 'property_type_display', 'room_type_display',
+             'city', 'county', 'bedroom', 'bathroom', 'max_guests', 'price_per_night',
+             'status', 'status_display', 'created_at', 'is_available',
+             'average_rating', 'review_count'
+        ]
+
+    # Columns ListingListSerializer reads, for .only() on the list queryset
+    ONLY_FIELDS = [
+        'property_id', 'name', 'property_type', 'room_type', 'city', 'county',
+        'bedroom', 'bathroom', 'max_guests', 'price_per_night', 'status', 'created_at',
+        'avg_rating', 'review_count', 'host__user_id', 'host__linked_user__username',
+    ]
+
+    @classmethod
+    def description_preview(cls):
+        # Annotation for the description field, only the first characters leave the database
+        return Left('description', cls.DESCRIPTION_PREVIEW_LENGTH)
+
+
+class BookingBulkCreateSerializer(serializers.ListSerializer):
+    """ List serializer used when BookingSerializer is called with many=True.
+    Looks up all listings and users with one query each and inserts the bookings in one go"""
+
+    def to_internal_value(self, data):
+        # Warm the listing cache so each child validate() doesn't query on its own
+        if isinstance(data, list):
+            ids = {item.get('property_id') for item in data if isinstance(item, dict)}
+            ids = {self._to_uuid(pk) for pk in ids} - {None}
+            listings = self.context.setdefault('listings', {})
+            listings.update(
+                Listing.objects.select_related('host__linked_user').in_bulk(ids, field_name = 'property_id')
+            )
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def _to_uuid(value):
+        try:
+            return uuid.UUID(str(value))
+        except (TypeError, ValueError):
+            return None
+
+    def create(self, validated_data):
+        listings = self.context.get('listings', {})
+        users = UserProfile.objects.select_related('linked_user').in_bulk(
+            {item.get('user_id') for item in validated_data} - {None}, field_name = 'user_id'
+        )
+
+        bookings = []
+        for item in validated_data:
+            property_id = item.pop('property_id')
+            user_id = item.pop('user_id', None)
+            if property_id not in listings or user_id not in users:
+                raise serializers.ValidationError("Invalid property or user ID")
+            listing = listings[property_id]
+            item['total_price'] = BookingSerializer.price_for(listing, item['start_date'], item['end_date'])
+            bookings.append(Booking(listing = listing, user = users[user_id], **item))
+
+        # Same guard as BookingSerializer.create, for the whole batch: lock the listings (in pk order
+        # so two batches can't deadlock) and look for overlaps with one query
+        with transaction.atomic():
+            list(Listing.objects.select_for_update().filter(
+                pk__in = {booking.listing_id for booking in bookings}
+            ).order_by('pk').values_list('pk', flat = True))
+            if Booking.objects.batch_overlaps(bookings):
+                raise serializers.ValidationError("The property is already booked for these dates")
+            created = Booking.objects.bulk_create(bookings)
+        # bulk_create sends no post_save, the availability filters on cached pages change
+        bump_listing_cache_version(Booking)
+        return created
+
+
 class BookingSerializer(serializers.ModelSerializer):
     """ Serializer for the booking model
     This handles the booking data including user, property and , dates, pricing, status"""
 
     # Include the related model data
-    property = ListingSerializer(read_only =True)
+    property = ListingSerializer(source = 'listing', read_only =True)
     user = UserProfileSerializer(read_only =True)
 
     # For creating bookings (write only fields)
+    # user_id can be left out when the view saves the booking for the requesting user
     property_id = serializers.UUIDField(write_only = True)
-    user_id = serializers.UUIDField(write_only =True)
+    user_id = serializers.UUIDField(write_only =True, required = False)
 
     # Calculated fields
     duration_nights = serializers.ReadOnlyField()
@@ -105,55 +222,104 @@ class BookingSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
-        read_only_fields = ['booking_id', 'created_at', 'updated_at']
+        # total_price is worked out from the listing (see price_for), never taken from the client
+        read_only_fields = ['booking_id', 'total_price', 'created_at', 'updated_at']
+        list_serializer_class = BookingBulkCreateSerializer
     
     def get_status_display(self,obj):
-        return obj.get_status_display()
+        return BOOKING_STATUS_MAP.get(obj.status, obj.status)
     def validate(self, data):
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
+        # A partial update that moves one date is checked against the booking's other date
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
 
         if start_date and end_date:
             if end_date <= start_date:
                 raise serializers.ValidationError("End date must be after the start date")
+            # Compared as timedeltas like the max_stay_length constraint, .days would drop a partial day
+            if end_date - start_date > timedelta(days = Booking.MAX_STAY_NIGHTS):
+                raise serializers.ValidationError(f"Stays cannot be longer than {Booking.MAX_STAY_NIGHTS} nights")
             
             #Validate the guest count against propery limits
             property_id = data.get('property_id')
-            guests_count = data.get('guests_count')
+            guests_count = data.get('guests')
 
             if property_id and guests_count:
-                try:
-                    listing = Listing.objects.get(property_id=property_id)
-                    if guests_count > listing.max_guests:
-                        raise serializers.ValidationError(
-                            f" Guests count ({guests_count}) cannot exceed property limit ({listing.max_guests})")
-                except Listing.DoesNotExist:
-                    raise serializers.ValidationError("Invalid property_id")
+                listing = self._get_listing(property_id)
+                if guests_count > listing.max_guests:
+                    raise serializers.ValidationError(
+                        f" Guests count ({guests_count}) cannot exceed property limit ({listing.max_guests})")
                 
-            return data
-        
+        return data
 
+    def _get_listing(self, property_id):
+        """ Fetch the listing once per request and keep it on the context so create() can reuse it.
+        The full row is loaded because the listing is rendered again in the response"""
+        listings = self.context.setdefault('listings', {})
+        if property_id not in listings:
+            try:
+                listings[property_id] = Listing.objects.select_related('host__linked_user').get(property_id=property_id)
+            except Listing.DoesNotExist:
+                raise serializers.ValidationError("Invalid property_id")
+        return listings[property_id]
+
+    @staticmethod
+    def price_for(listing, start_date, end_date):
+        """ Total price of a stay, the listing's nightly price times the number of nights"""
+        return listing.price_per_night * (end_date - start_date).days
 
     def create(self, validated_data):
         #Custom create method to handle foreign key relationships
         property_id = validated_data.pop('property_id')
-        user_id = validated_data.pop('user_id')
-
-        try:
-            property_obj = Listing.objects.get(property_id=property_id)
-            user_obj = UserProfile.objects.get(user_id = user_id)
-        except (Listing.DoesNotExist, UserProfile.DoesNotExist):
-            raise serializers.ValidationError("Invalid property or user ID")
+        user_id = validated_data.pop('user_id', None)
+        # The view passes the requesting user's profile as save(user=...)
+        user_obj = validated_data.pop('user', None)
+
+        property_obj = self._get_listing(property_id)
+        if user_obj is None:
+            try:
+                user_obj = UserProfile.objects.select_related('linked_user').get(user_id = user_id)
+            except UserProfile.DoesNotExist:
+                raise serializers.ValidationError("Invalid property or user ID")
+        validated_data['total_price'] = self.price_for(property_obj, validated_data['start_date'], validated_data['end_date'])
         
-        #create the booking
-        booking = Booking.objects.create(
+        # MySQL has no exclusion constraints, so lock the listing row while checking for overlaps.
+        # Concurrent bookings for the same listing wait here instead of both passing the check
+        with transaction.atomic():
+            list(Listing.objects.select_for_update().filter(property_id = property_obj.property_id).values_list('pk', flat = True))
+            if Booking.objects.overlapping(property_obj, validated_data['start_date'], validated_data['end_date']).exists():
+                raise serializers.ValidationError("The property is already booked for these dates")
+
+            #create the booking
+            booking = Booking.objects.create(
+
+                listing = property_obj,
+                user = user_obj,
+                **validated_data
+            )
+        return booking
 
-            property = property_obj,
-            user = user_obj,
-            **validated_data
-        )
+    def update(self, instance, validated_data):
+        # A booking stays on its listing and guest, only the dates, guest count and status change
+        validated_data.pop('property_id', None)
+        validated_data.pop('user_id', None)
+        start_date = validated_data.get('start_date', instance.start_date)
+        end_date = validated_data.get('end_date', instance.end_date)
+        if (start_date, end_date) == (instance.start_date, instance.end_date):
+            return super().update(instance, validated_data)
+
+        # New dates go through the same listing lock and overlap check as create(), leaving
+        # out the booking's own current dates, and the price follows the new number of nights
+        with transaction.atomic():
+            list(Listing.objects.select_for_update().filter(property_id = instance.listing_id).values_list('pk', flat = True))
+            if Booking.objects.overlapping(instance.listing_id, start_date, end_date).exclude(pk = instance.pk).exists():
+                raise serializers.ValidationError("The property is already booked for these dates")
+            validated_data['total_price'] = self.price_for(instance.listing, start_date, end_date)
+            booking = super().update(instance, validated_data)
+        # duration_nights is cached on the instance and rendered in the response
+        booking.__dict__.pop('duration_nights', None)
         return booking
-    
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     """ Serializer for review data.
@@ -162,7 +328,7 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     #Include related model data
     user = UserProfileSerializer(read_only =True)
-    property = ListingSerializer(read_only = True)
+    property = ListingSerializer(source = 'listing', read_only = True)
 
     # For creating reviews (write-only fields)
     booking_id = serializers.UUIDField(write_only = True)
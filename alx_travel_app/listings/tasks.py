@@ -10,48 +10,193 @@ This module contains background tasks for:
 - Notification tasks
 """
 
+import hashlib
 import logging
-from datetime import datetime, timedelta
-from decimal import Decimal
+import smtplib
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-from celery import shared_task
-from django.core.mail import send_mail, EmailMultiAlternatives
+from celery import current_app, group, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import task_failure, task_prerun, task_retry, task_success
+from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Q
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
 from django.utils.html import strip_tags
 from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Models are imported at module level: models.py doesn't import the tasks, so there is no cycle
+from .models import AnalyticsSnapshot, Booking, Listing, Review
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=None)
+def _get_email_template(template_name):
+    """
+    Load and compile an email template once per worker process.
+    The invariant markup and CSS end up as constant text nodes in the compiled
+    template, so each render only formats the few per-booking variables.
+    """
+    return get_template(template_name)
+
+# Network level failures worth retrying. Refused recipients, template bugs and
+# other errors won't fix themselves, so those fail straight away
+TRANSIENT_EMAIL_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# How long a sent email is remembered, so retries and duplicate deliveries don't resend it
+EMAIL_DEDUP_TIMEOUT = 60 * 60 * 24
+
+
+# Template context that is the same for every email, built once per worker
+_STATIC_EMAIL_CONTEXT = {
+    'company_name': 'ALX Travel App',
+    'support_email': settings.ADMIN_EMAIL,
+}
+
+
+# Copyright year for the email footers, computed once and refreshed when the year rolls over
+_year = None
+_next_year_starts_at = 0.0
+
+
+def _current_year():
+    global _year, _next_year_starts_at
+    if time.time() >= _next_year_starts_at:
+        _year = datetime.now(dt_timezone.utc).year
+        _next_year_starts_at = datetime(_year + 1, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+    return _year
+
+
+# Email backend classes by dotted path, so sending doesn't re-import the backend every time.
+# Keyed on the setting rather than bound at import so override_settings in tests still applies
+_email_backends = {}
+
+
+def _get_connection():
+    """
+    Return a new email connection for the configured backend.
+    Stands in for get_connection() inside send_mail(), without the per-call import_string().
+    A connection isn't kept open between tasks: the gevent emails worker runs each task
+    in a fresh greenlet, so a cached one would just be left to the garbage collector.
+    """
+    backend = _email_backends.get(settings.EMAIL_BACKEND)
+    if backend is None:
+        backend = _email_backends[settings.EMAIL_BACKEND] = import_string(settings.EMAIL_BACKEND)
+    return backend(fail_silently=False)
+
+
+def _email_sent_key(booking_id, stage):
+    return f"email:sent:{booking_id}:{stage}"
+
+
+def _content_hash(*parts):
+    # Short digest of what an email says, so a changed email gets a new dedup key
+    return hashlib.sha1('|'.join(str(part or '') for part in parts).encode()).hexdigest()[:12]
+
+
+def _format_email_date(value):
+    # Dates are formatted by the worker, the views only send the booking id
+    return value.strftime('%B %d, %Y')
+
+
+def _confirmation_email_args(booking):
+    """
+    Build the confirmation email fields from a booking loaded with its guest, listing and host.
+    """
+    user = booking.user.linked_user
+    listing = booking.listing
+    host = listing.host.linked_user
+    return {
+        'user_email': user.email,
+        'user_name': user.get_full_name() or user.username,
+        'listing_title': listing.name,
+        'check_in_date': _format_email_date(booking.start_date),
+        'check_out_date': _format_email_date(booking.end_date),
+        'total_price': str(booking.total_price),
+        'booking_details': {
+            'duration_nights': booking.duration_nights,
+            'guests': booking.guests,
+            'property_type': listing.property_type,
+            'city': listing.city,
+            'host_name': host.get_full_name() or host.username,
+        },
+    }
+
+
 # =========================
 # EMAIL TASKS
 # =========================
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60}, name='send_booking_confirmation_email')
-def send_booking_confirmation_email(self, booking_id, user_email, user_name, listing_title, check_in_date, check_out_date, total_price=None, booking_details=None):
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_backoff=60, retry_backoff_max=600, retry_jitter=True, retry_kwargs={'max_retries': 5}, acks_late=True, acks_on_failure_or_timeout=False, ignore_result=False, name='send_booking_confirmation_email')
+def send_booking_confirmation_email(self, booking_id, user_email=None, user_name=None, listing_title=None, check_in_date=None, check_out_date=None, total_price=None, booking_details=None, dedup=True):
     """
     Send a booking confirmation email asynchronously.
     
     Args:
         booking_id (int): The ID of the booking
-        user_email (str): User's email address
+        user_email (str, optional): User's email address. When left out, every other
+            field is read from the booking row instead of the task payload
         user_name (str): User's full name
         listing_title (str): Name of the booked listing
         check_in_date (str): Check-in date
         check_out_date (str): Check-out date
         total_price (str, optional): Total booking price
         booking_details (dict, optional): Additional booking details
+        dedup (bool, optional): Skip the email if the same confirmation was already sent.
+            Test emails turn this off, they reuse a fixed booking id
     
     Returns:
         str: Success message or raises exception for retry
     """
     try:
         # Log the task start
-        logger.info(f"Starting booking confirmation email task for booking {booking_id}")
+        logger.info("Starting booking confirmation email task for booking %s", booking_id)
+        
+        # Views only send the booking id, the rest is loaded here in one query
+        if user_email is None:
+            try:
+                booking = Booking.objects.select_related(
+                    'user__linked_user', 'listing__host__linked_user'
+                ).get(booking_id=booking_id)
+            except Booking.DoesNotExist:
+                logger.warning("Booking %s no longer exists, skipping confirmation email", booking_id)
+                return "missing"
+            fields = _confirmation_email_args(booking)
+            user_email = fields['user_email']
+            user_name = fields['user_name']
+            listing_title = fields['listing_title']
+            check_in_date = fields['check_in_date']
+            check_out_date = fields['check_out_date']
+            total_price = fields['total_price']
+            booking_details = fields['booking_details']
+        
+        # Skip if this confirmation already went out (a retry after a successful send).
+        # The dates and price are part of the key, so a booking update confirms the new dates
+        sent_key = _email_sent_key(
+            booking_id, f'confirmation:{_content_hash(check_in_date, check_out_date, total_price)}'
+        )
+        if dedup and cache.get(sent_key):
+            logger.info("Booking confirmation email for booking %s already sent, skipping", booking_id)
+            return "duplicate"
         
         # Prepare email context
         context = {
+            **_STATIC_EMAIL_CONTEXT,
             'user_name': user_name,
             'booking_id': booking_id,
             'listing_title': listing_title,
@@ -59,9 +204,7 @@ def send_booking_confirmation_email(self, booking_id, user_email, user_name, lis
             'check_out_date': check_out_date,
             'total_price': total_price,
             'booking_details': booking_details or {},
-            'company_name': 'ALX Travel App',
-            'support_email': settings.ADMIN_EMAIL,
-            'current_year': datetime.now().year,
+            'current_year': _current_year(),
         }
         
         # Email subject
@@ -69,82 +212,15 @@ def send_booking_confirmation_email(self, booking_id, user_email, user_name, lis
         
         # Try to render HTML template, fallback to plain text
         try:
-            # Create HTML email content (you can create this template later)
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <title>Booking Confirmation</title>
-                <style>
-                    body {{ font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; }}
-                    .header {{ background-color: #007bff; color: white; padding: 20px; text-align: center; }}
-                    .content {{ padding: 20px; }}
-                    .booking-details {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                    .footer {{ background-color: #6c757d; color: white; padding: 15px; text-align: center; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <h1>Booking Confirmed!</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {user_name},</p>
-                    
-                    <p>Great news! Your booking has been confirmed. We're excited to host you!</p>
-                    
-                    <div class="booking-details">
-                        <h3>Booking Details</h3>
-                        <p><strong>Booking ID:</strong> {booking_id}</p>
-                        <p><strong>Property:</strong> {listing_title}</p>
-                        <p><strong>Check-in:</strong> {check_in_date}</p>
-                        <p><strong>Check-out:</strong> {check_out_date}</p>
-                        {f"<p><strong>Total Price:</strong> ${total_price}</p>" if total_price else ""}
-                    </div>
-                    
-                    <h3>Need Help?</h3>
-                    <p>If you have any questions or need to make changes to your booking, please contact us at:</p>
-                    <p><a href="mailto:{settings.ADMIN_EMAIL}">{settings.ADMIN_EMAIL}</a></p>
-                    
-                    <p>We look forward to providing you with an amazing experience!</p>
-                    
-                    <p>Best regards,<br>The ALX Travel Team</p>
-                </div>
-                <div class="footer">
-                    <p>&copy; {datetime.now().year} ALX Travel App. All rights reserved.</p>
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Create plain text version
-            plain_text_content = f"""
-            Dear {user_name},
-            
-            Great news! Your booking has been confirmed.
-            
-            Booking Details:
-            - Booking ID: {booking_id}
-            - Property: {listing_title}
-            - Check-in: {check_in_date}
-            - Check-out: {check_out_date}
-            {f"- Total Price: ${total_price}" if total_price else ""}
-            
-            If you have any questions, please contact us at {settings.ADMIN_EMAIL}
-            
-            We look forward to hosting you!
-            
-            Best regards,
-            The ALX Travel Team
-            
-            ---
-            © {datetime.now().year} ALX Travel App. All rights reserved.
-            This is an automated message. Please do not reply to this email.
-            """
+            # Both templates are compiled once per worker and reused for every email
+            html_content = _get_email_template('emails/booking_confirmation.html').render(context)
+            try:
+                plain_text_content = _get_email_template('emails/booking_confirmation.txt').render(context)
+            except TemplateDoesNotExist:
+                plain_text_content = strip_tags(html_content)
             
         except Exception as template_error:
-            logger.warning(f"Template rendering failed: {template_error}, using fallback")
+            logger.warning("Template rendering failed: %s, using fallback", template_error)
             html_content = None
             plain_text_content = f"""
             Dear {user_name},
@@ -171,66 +247,59 @@ def send_booking_confirmation_email(self, booking_id, user_email, user_name, lis
                 subject=subject,
                 body=plain_text_content,
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[user_email]
+                to=[user_email],
+                connection=_get_connection(),
             )
             email.attach_alternative(html_content, "text/html")
             email.send(fail_silently=False)
         else:
             # Send plain text email
-            send_mail(
+            EmailMessage(
                 subject=subject,
-                message=plain_text_content,
+                body=plain_text_content,
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user_email],
-                fail_silently=False,
-            )
+                to=[user_email],
+                connection=_get_connection(),
+            ).send()
+        
+        # Remember the send before anything else can fail and trigger a retry
+        if dedup:
+            cache.set(sent_key, 1, timeout=EMAIL_DEDUP_TIMEOUT)
         
         # Log success
-        logger.info(f"Booking confirmation email sent successfully for booking {booking_id} to {user_email}")
+        logger.info("Booking confirmation email sent successfully for booking %s to %s", booking_id, user_email)
         
         return f"Booking confirmation email sent successfully to {user_email}"
         
     except Exception as exc:
         # Log the error
-        logger.error(f"Failed to send booking confirmation email for booking {booking_id}: {str(exc)}")
+        logger.error("Failed to send booking confirmation email for booking %s: %s", booking_id, exc)
         
-        # Retry the task
-        raise self.retry(exc=exc)
+        # Transient SMTP errors are retried with backoff by autoretry_for, anything else fails fast
+        raise
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 2, 'countdown': 120}, name='send_booking_reminder_email')
-def send_booking_reminder_email(self, booking_id, user_email, user_name, listing_title, check_in_date, days_until_checkin=1):
+# Reminder lines for the last few days before check-in, anything further out is formatted on the fly
+_REMINDER_MESSAGES = {
+    0: "Your check-in is today!",
+    1: "Your check-in is tomorrow!",
+    2: "Your check-in is in 2 days!",
+    3: "Your check-in is in 3 days!",
+}
+
+
+def _build_reminder_email(booking_id, user_name, listing_title, check_in_date, days_until_checkin):
     """
-    Send a booking reminder email before check-in.
+    Build the subject and plain text body of a reminder email.
+    Shared by the single and the batch reminder tasks.
+    """
+    # Determine reminder message based on days (a stay that already started counts as today)
+    days = max(days_until_checkin, 0)
+    reminder_message = _REMINDER_MESSAGES.get(days) or f"Your check-in is in {days} days."
     
-    Args:
-        booking_id (int): The ID of the booking
-        user_email (str): User's email address
-        user_name (str): User's full name
-        listing_title (str): Name of the booked listing
-        check_in_date (str): Check-in date
-        days_until_checkin (int): Number of days until check-in
+    subject = f'Upcoming Stay Reminder - {listing_title}'
     
-    Returns:
-        str: Success message
-    """
-    try:
-        logger.info(f"Sending booking reminder email for booking {booking_id}")
-        
-        # Determine reminder message based on days
-        if days_until_checkin <= 1:
-            reminder_message = "Your check-in is tomorrow!"
-            urgency = "high"
-        elif days_until_checkin <= 3:
-            reminder_message = f"Your check-in is in {days_until_checkin} days!"
-            urgency = "medium"
-        else:
-            reminder_message = f"Your check-in is in {days_until_checkin} days."
-            urgency = "low"
-        
-        subject = f'Upcoming Stay Reminder - {listing_title}'
-        
-        message = f"""
+    message = f"""
         Dear {user_name},
         
         {reminder_message}
@@ -248,24 +317,195 @@ def send_booking_reminder_email(self, booking_id, user_email, user_name, listing
         Best regards,
         The ALX Travel Team
         """
-        
-        send_mail(
+    return subject, message
+
+
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_backoff=60, retry_backoff_max=600, retry_jitter=True, retry_kwargs={'max_retries': 5}, acks_late=True, acks_on_failure_or_timeout=False, ignore_result=False, name='send_booking_reminder_email')
+def send_booking_reminder_email(self, booking_id, user_email=None, user_name=None, listing_title=None, check_in_date=None, days_until_checkin=1):
+    """
+    Send a booking reminder email before check-in.
+    
+    Args:
+        booking_id (int): The ID of the booking
+        user_email (str, optional): User's email address. When left out, the name, listing
+            and check-in date are read from the booking row
+        user_name (str): User's full name
+        listing_title (str): Name of the booked listing
+        check_in_date (str): Check-in date
+        days_until_checkin (int): Number of days until check-in
+    
+    Returns:
+        str: Success message
+    """
+    try:
+        logger.info("Sending booking reminder email for booking %s", booking_id)
+        
+        # One reminder per booking per countdown day
+        sent_key = _email_sent_key(booking_id, f'reminder:{days_until_checkin}')
+        if cache.get(sent_key):
+            logger.info("Booking reminder email for booking %s already sent, skipping", booking_id)
+            return "duplicate"
+        
+        if user_email is None:
+            try:
+                booking = Booking.objects.select_related('listing', 'user__linked_user').get(booking_id=booking_id)
+            except Booking.DoesNotExist:
+                logger.warning("Booking %s no longer exists, skipping reminder email", booking_id)
+                return "missing"
+            user = booking.user.linked_user
+            user_email = user.email
+            user_name = user.get_full_name() or user.username
+            listing_title = booking.listing.name
+            check_in_date = _format_email_date(booking.start_date)
+        
+        subject, message = _build_reminder_email(booking_id, user_name, listing_title, check_in_date, days_until_checkin)
+        
+        EmailMessage(
             subject=subject,
-            message=message,
+            body=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user_email],
-            fail_silently=False,
-        )
+            to=[user_email],
+            connection=_get_connection(),
+        ).send()
         
-        logger.info(f"Booking reminder email sent successfully for booking {booking_id}")
+        cache.set(sent_key, 1, timeout=EMAIL_DEDUP_TIMEOUT)
+        logger.info("Booking reminder email sent successfully for booking %s", booking_id)
         return f"Reminder email sent to {user_email}"
         
     except Exception as exc:
-        logger.error(f"Failed to send booking reminder email for booking {booking_id}: {str(exc)}")
-        raise self.retry(exc=exc)
+        logger.error("Failed to send booking reminder email for booking %s: %s", booking_id, exc)
+        raise
 
 
-@shared_task(name='send_booking_cancellation_email')
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_backoff=60, retry_backoff_max=600, retry_jitter=True, retry_kwargs={'max_retries': 5}, acks_late=True, acks_on_failure_or_timeout=False, name='send_booking_reminder_emails_batch')
+def send_booking_reminder_emails_batch(self, booking_ids):
+    """
+    Send reminder emails for many bookings over a single SMTP connection.
+    
+    Args:
+        booking_ids (list): IDs of the bookings to remind
+    
+    Returns:
+        str: Success message
+    """
+    try:
+        # Everything the email needs comes back in one query
+        bookings = Booking.objects.select_related('listing', 'user__linked_user').filter(booking_id__in=booking_ids)
+        today = timezone.now().date()
+        
+        # Same sent keys as send_booking_reminder_email, so a redelivered or retried batch
+        # skips the guests it already reached
+        days_until = {booking.booking_id: (booking.start_date.date() - today).days for booking in bookings}
+        sent_keys = {
+            booking.booking_id: _email_sent_key(booking.booking_id, f'reminder:{days_until[booking.booking_id]}')
+            for booking in bookings
+        }
+        already_sent = cache.get_many(sent_keys.values())
+        
+        connection = _get_connection()
+        messages = []
+        message_keys = []
+        for booking in bookings:
+            user = booking.user.linked_user
+            if not user.email or sent_keys[booking.booking_id] in already_sent:
+                continue
+            subject, message = _build_reminder_email(
+                booking.booking_id,
+                user.get_full_name() or user.username,
+                booking.listing.name,
+                _format_email_date(booking.start_date),
+                days_until[booking.booking_id],
+            )
+            messages.append(EmailMessage(
+                subject=subject,
+                body=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[user.email],
+                connection=connection,
+            ))
+            message_keys.append(sent_keys[booking.booking_id])
+        
+        # One SMTP session for the whole batch
+        sent, failed = _send_over_one_connection(messages, connection, sent_keys=message_keys)
+        
+        logger.info("Sent %s booking reminder emails in one batch, %s failed", sent, failed)
+        return f"Reminder emails sent to {sent} guests"
+        
+    except Exception as exc:
+        logger.error("Failed to send batched booking reminder emails: %s", exc)
+        raise
+
+
+def _send_over_one_connection(messages, connection, sent_keys=None):
+    """
+    Send prepared messages over an already created connection, opening it once.
+    Gives up on the rest of the batch once more than a third of the sends have failed,
+    so a broken SMTP server isn't hammered with the whole batch.
+    
+    Args:
+        sent_keys (list, optional): Dedup key per message, set as soon as that message is sent
+    
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    sent = failed = 0
+    connection.open()
+    try:
+        for index, message in enumerate(messages):
+            try:
+                sent += connection.send_messages([message]) or 0
+                if sent_keys:
+                    cache.set(sent_keys[index], 1, timeout=EMAIL_DEDUP_TIMEOUT)
+            except SoftTimeLimitExceeded:
+                # The time limit stops the whole batch, it isn't one failed message
+                raise
+            except Exception as exc:
+                failed += 1
+                logger.warning("Batch email to %s failed: %s", message.to, exc)
+                if failed * 3 > len(messages):
+                    logger.error("Aborting email batch after %s failures out of %s", failed, len(messages))
+                    break
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def queue_booking_reminder_batches(booking_ids, batch_size=100):
+    """
+    Split the bookings into batches and queue one batch task per slice as a Celery group.
+    """
+    booking_ids = [str(booking_id) for booking_id in booking_ids]
+    return group(
+        send_booking_reminder_emails_batch.s(booking_ids[i:i + batch_size])
+        for i in range(0, len(booking_ids), batch_size)
+    ).apply_async()
+
+
+@shared_task(ignore_result=True, name='queue_daily_booking_reminders')
+def queue_daily_booking_reminders():
+    """
+    Queue reminder emails for every confirmed booking checking in tomorrow.
+    Runs daily from the beat schedule, the emails go out in batches (see queue_booking_reminder_batches).
+    
+    Returns:
+        int: Number of bookings reminded
+    """
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    day_start = timezone.make_aware(datetime.combine(tomorrow, datetime.min.time()))
+    # A range on start_date rather than start_date__date, so the (status, start_date, end_date) index is used
+    booking_ids = list(Booking.objects.filter(
+        status='confirmed',
+        start_date__gte=day_start,
+        start_date__lt=day_start + timedelta(days=1),
+    ).values_list('booking_id', flat=True))
+    
+    if booking_ids:
+        queue_booking_reminder_batches(booking_ids)
+    logger.info("Queued reminder emails for %s bookings checking in on %s", len(booking_ids), tomorrow)
+    return len(booking_ids)
+
+
+@shared_task(acks_late=True, acks_on_failure_or_timeout=False, ignore_result=True, name='send_booking_cancellation_email')
 def send_booking_cancellation_email(booking_id, user_email, user_name, listing_title, cancellation_reason=None):
     """
     Send a booking cancellation email.
@@ -281,51 +521,104 @@ def send_booking_cancellation_email(booking_id, user_email, user_name, listing_t
         str: Success message
     """
     try:
-        logger.info(f"Sending booking cancellation email for booking {booking_id}")
+        logger.info("Sending booking cancellation email for booking %s", booking_id)
         
-        subject = f'Booking Cancellation - {listing_title}'
-        
-        message = f"""
-        Dear {user_name},
+        # The reason is part of the key so a corrected cancellation notice still goes out
+        sent_key = _email_sent_key(booking_id, f'cancellation:{_content_hash(cancellation_reason)}')
+        if cache.get(sent_key):
+            logger.info("Booking cancellation email for booking %s already sent, skipping", booking_id)
+            return "duplicate"
         
-        We're writing to confirm that your booking has been cancelled.
-        
-        Cancelled Booking Details:
-        - Booking ID: {booking_id}
-        - Property: {listing_title}
-        {f"- Cancellation Reason: {cancellation_reason}" if cancellation_reason else ""}
-        
-        If you have any questions about this cancellation or need assistance with 
-        a new booking, please contact us at {settings.ADMIN_EMAIL}
-        
-        Thank you for choosing ALX Travel App.
+        subject = f'Booking Cancellation - {listing_title}'
         
-        Best regards,
-        The ALX Travel Team
-        """
+        message = _get_email_template('emails/booking_cancellation.txt').render({
+            **_STATIC_EMAIL_CONTEXT,
+            'user_name': user_name,
+            'booking_id': booking_id,
+            'listing_title': listing_title,
+            'cancellation_reason': cancellation_reason,
+        })
         
-        send_mail(
+        EmailMessage(
             subject=subject,
-            message=message,
+            body=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user_email],
-            fail_silently=False,
-        )
+            to=[user_email],
+            connection=_get_connection(),
+        ).send()
         
-        logger.info(f"Booking cancellation email sent successfully for booking {booking_id}")
+        cache.set(sent_key, 1, timeout=EMAIL_DEDUP_TIMEOUT)
+        logger.info("Booking cancellation email sent successfully for booking %s", booking_id)
         return f"Cancellation email sent to {user_email}"
         
     except Exception as exc:
-        logger.error(f"Failed to send booking cancellation email for booking {booking_id}: {str(exc)}")
+        logger.error("Failed to send booking cancellation email for booking %s: %s", booking_id, exc)
         raise exc
 
+# TASK STATUS
+
+# Tasks whose state the api/email-task-status/ endpoint reports
+STATUS_TRACKED_TASKS = {'send_booking_confirmation_email', 'send_booking_reminder_email', 'test_celery_connection'}
+TASK_STATUS_TIMEOUT = 60 * 60
+
+
+def task_status_key(task_id):
+    return f"task-status:{task_id}"
+
+
+def task_status_cache_shared():
+    """
+    Whether task states pushed into the cache are visible to the other processes.
+    A process-local cache (the locmem default, or dummy) is only shared when tasks run eagerly
+    in this same process. Otherwise the status endpoints read the result backend instead.
+    """
+    if current_app.conf.task_always_eager:
+        return True
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _set_task_status(task_id, state, **extra):
+    # Nobody could read the state from a cache local to the worker
+    if task_status_cache_shared():
+        cache.set(task_status_key(task_id), {'status': state, **extra}, timeout=TASK_STATUS_TIMEOUT)
+
+
+# The worker pushes each state change into the cache as it happens, so status polls
+# read one cache key instead of querying the result backend every time
+@task_prerun.connect
+def _task_started(sender=None, task_id=None, **kwargs):
+    if sender.name in STATUS_TRACKED_TASKS:
+        _set_task_status(task_id, 'STARTED')
+
+
+@task_retry.connect
+def _task_retried(sender=None, request=None, reason=None, **kwargs):
+    if sender.name in STATUS_TRACKED_TASKS:
+        _set_task_status(request.id, 'RETRY', error=str(reason))
+
+
+@task_success.connect
+def _task_succeeded(sender=None, result=None, **kwargs):
+    if sender.name in STATUS_TRACKED_TASKS:
+        _set_task_status(sender.request.id, 'SUCCESS', result=result)
+
+
+@task_failure.connect
+def _task_failed(sender=None, task_id=None, exception=None, **kwargs):
+    if sender.name in STATUS_TRACKED_TASKS:
+        _set_task_status(task_id, 'FAILURE', error=str(exception))
+
 # MAINTENANCE TASKS
 
-@shared_task(name='cleanup_old_logs')
+# How long daily analytics snapshots are kept
+ANALYTICS_RETENTION_DAYS = 365
+
+
+@shared_task(ignore_result=True, name='cleanup_old_logs')
 def cleanup_old_logs():
     """
-    Clean up old log files and temporary data.
-    This is an example of a periodic maintenance task.
+    Clean up old data: expired sessions and analytics snapshots past the retention window.
+    Runs weekly from the beat schedule.
     
     Returns:
         str: Cleanup summary
@@ -333,32 +626,58 @@ def cleanup_old_logs():
     try:
         logger.info("Starting log cleanup task")
         
-        # Example cleanup logic (implement based on your needs)
+        now = timezone.now()
+        
+        # Each cleanup is a single DELETE ... WHERE on an indexed date column. Neither model has
+        # delete signals or reverse relations, so Django deletes them without loading any rows
+        sessions_removed, _ = Session.objects.filter(expire_date__lt=now).delete()
+        snapshots_removed, _ = AnalyticsSnapshot.objects.filter(
+            date__lt=(now - timedelta(days=ANALYTICS_RETENTION_DAYS)).date()
+        ).delete()
+        
         cleanup_summary = {
-            'logs_cleaned': 0,
-            'temp_files_removed': 0,
-            'database_cleanup': False
+            'expired_sessions_removed': sessions_removed,
+            'old_snapshots_removed': snapshots_removed,
         }
         
-        # You could implement actual cleanup logic here:
-        # - Remove old log files
-        # - Clean up temporary uploads
-        # - Archive old data
-        # - Optimize database
-        
         logger.info("Log cleanup task completed successfully")
         return f"Cleanup completed: {cleanup_summary}"
         
     except Exception as exc:
-        logger.error(f"Log cleanup task failed: {str(exc)}")
+        logger.error("Log cleanup task failed: %s", exc)
         raise exc
 
 
-@shared_task(name='send_admin_notification')
+# Identical admin alerts within this many seconds are folded into one digest email.
+# The held alerts live in the default cache, so alerts are only folded across workers when
+# CACHE_URL points at a shared cache. With the locmem default each worker process keeps its own digest
+ADMIN_ALERT_WINDOW = 60
+# Held alerts outlive a few missed flushes before they are dropped
+ADMIN_ALERT_PENDING_TIMEOUT = ADMIN_ALERT_WINDOW * 10
+
+
+def _admin_alert_key(subject):
+    return f"admin-alert:{hashlib.sha1(subject.encode()).hexdigest()}"
+
+
+def _send_admin_email(subject, message, admin_emails):
+    EmailMessage(
+        subject=f"{settings.EMAIL_SUBJECT_PREFIX}{subject}",
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=admin_emails,
+        connection=_get_connection(),
+    ).send()
+
+
+@shared_task(ignore_result=True, rate_limit='10/m', name='send_admin_notification')
 def send_admin_notification(subject, message, admin_emails=None):
     """
     Send notification email to administrators.
     
+    The first alert with a given subject goes out straight away. Repeats within
+    ADMIN_ALERT_WINDOW seconds are collected and sent as one digest when the window closes.
+    
     Args:
         subject (str): Email subject
         message (str): Email message
@@ -371,26 +690,61 @@ def send_admin_notification(subject, message, admin_emails=None):
         if not admin_emails:
             admin_emails = [settings.ADMIN_EMAIL]
         
-        full_subject = f"{settings.EMAIL_SUBJECT_PREFIX}{subject}"
-        
-        send_mail(
-            subject=full_subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=admin_emails,
-            fail_silently=False,
-        )
-        
-        logger.info(f"Admin notification sent: {subject}")
+        key = _admin_alert_key(subject)
+        if not cache.add(f"{key}:window", 1, timeout=ADMIN_ALERT_WINDOW):
+            # Same alert already sent in this window, hold it for the digest.
+            # Each held message gets its own key, numbered by an atomic counter, so concurrent
+            # alerts never overwrite each other
+            cache.add(f"{key}:count", 0, timeout=None)
+            number = cache.incr(f"{key}:count")
+            cache.set(f"{key}:pending:{number}", message, timeout=ADMIN_ALERT_PENDING_TIMEOUT)
+            # Set after the message is stored: a flush that already ran before it schedules the next one
+            if cache.add(f"{key}:flush", 1, timeout=ADMIN_ALERT_WINDOW * 2):
+                flush_admin_notifications.apply_async((subject, admin_emails), countdown=ADMIN_ALERT_WINDOW)
+            logger.info("Admin notification coalesced: %s", subject)
+            return "coalesced"
+        
+        _send_admin_email(subject, message, admin_emails)
+        
+        logger.info("Admin notification sent: %s", subject)
         return f"Admin notification sent to {len(admin_emails)} recipients"
         
     except Exception as exc:
-        logger.error(f"Failed to send admin notification: {str(exc)}")
+        logger.error("Failed to send admin notification: %s", exc)
         raise exc
 
+
+@shared_task(ignore_result=True, name='flush_admin_notifications')
+def flush_admin_notifications(subject, admin_emails):
+    """
+    Send the alerts collected by send_admin_notification for one subject as a single digest.
+    """
+    key = _admin_alert_key(subject)
+    # Cleared first, so an alert held from here on schedules another flush
+    cache.delete(f"{key}:flush")
+    flushed = cache.get(f"{key}:flushed", 0)
+    count = cache.get(f"{key}:count", 0)
+    keys = [f"{key}:pending:{number}" for number in range(flushed + 1, count + 1)]
+    found = cache.get_many(keys)
+    
+    # Stop at the first message whose sender hasn't stored it yet, that sender schedules the next flush
+    pending = []
+    for pending_key in keys:
+        if pending_key not in found:
+            break
+        pending.append(found[pending_key])
+    if not pending:
+        return
+    cache.set(f"{key}:flushed", flushed + len(pending), timeout=None)
+    cache.delete_many(keys[:len(pending)])
+    
+    digest = f"\n\n---\n\n".join(pending)
+    _send_admin_email(f"{subject} (x{len(pending)})", digest, admin_emails)
+    logger.info("Admin notification digest sent: %s (%s alerts)", subject, len(pending))
+
 # UTILITY TASKS
 
-@shared_task(name='process_booking_analytics')
+@shared_task(ignore_result=True, name='process_booking_analytics')
 def process_booking_analytics(date_range=None):
     """
     Process booking analytics data (example background task).
@@ -398,37 +752,58 @@ def process_booking_analytics(date_range=None):
     Args:
         date_range (dict, optional): Date range for analytics
     
+    The summary is saved as today's AnalyticsSnapshot row.
+    
     Returns:
         dict: Analytics summary
     """
     try:
         logger.info("Processing booking analytics")
         
-        # Import here to avoid circular imports
-        from .models import Booking, Listing
+        # NumPy is only needed here, so keep it out of worker start-up
+        import numpy as np
+        
+        # Rating breakdown over every review. The ratings are streamed into a uint8 array
+        # and counted in one vectorised pass instead of a Python loop over review objects
+        ratings = np.fromiter(Review.objects.values_list('rating', flat=True).iterator(), dtype=np.uint8)
+        rating_counts = np.bincount(ratings, minlength=6)[1:]
+        
+        # One conditional aggregate per table instead of a COUNT query per figure
+        booking_counts = Booking.objects.aggregate(
+            total=Count('pk'),
+            confirmed=Count('pk', filter=Q(status='confirmed')),
+            completed=Count('pk', filter=Q(status='completed')),
+        )
+        listing_counts = Listing.objects.aggregate(
+            total=Count('pk'),
+            active=Count('pk', filter=Q(status='approved')),
+        )
         
         # Example analytics processing
         analytics = {
-            'total_bookings': Booking.objects.count(),
-            'confirmed_bookings': Booking.objects.filter(status='confirmed').count(),
-            'completed_bookings': Booking.objects.filter(status='completed').count(),
-            'total_listings': Listing.objects.count(),
-            'active_listings': Listing.objects.filter(status='approved').count(),
-            'processed_at': timezone.now().isoformat()
+            'total_reviews': int(ratings.size),
+            'average_rating': round(float(ratings.mean()), 2) if ratings.size else 0,
+            'rating_distribution': {star: int(count) for star, count in enumerate(rating_counts, start=1)},
+            'total_bookings': booking_counts['total'],
+            'confirmed_bookings': booking_counts['confirmed'],
+            'completed_bookings': booking_counts['completed'],
+            'total_listings': listing_counts['total'],
+            'active_listings': listing_counts['active'],
         }
         
-        # You could save this data to a AnalyticsReport model
-        # or send it to an external analytics service
+        # Store the snapshot in the database rather than the result backend, nobody polls this task.
+        # One row per day, so a re-run just overwrites it
+        AnalyticsSnapshot.objects.update_or_create(date=timezone.now().date(), defaults=analytics)
         
-        logger.info(f"Analytics processed: {analytics}")
+        logger.info("Analytics processed: %s", analytics)
         return analytics
         
     except Exception as exc:
-        logger.error(f"Analytics processing failed: {str(exc)}")
+        logger.error("Analytics processing failed: %s", exc)
         raise exc
 
 
-@shared_task(bind=True, name='test_celery_connection')
+@shared_task(bind=True, ignore_result=False, name='test_celery_connection')
 def test_celery_connection(self):
     """
     Test task to verify Celery is working correctly.
@@ -437,26 +812,25 @@ def test_celery_connection(self):
         dict: Connection test results
     """
     try:
-        import time
-        start_time = time.time()
+        start_time = time.monotonic()
         
-        # Simulate some work
-        time.sleep(1)
+        # No simulated work: the task reaching a worker through the broker already proves Celery is up,
+        # and sleeping would pin the worker slot for every check
         
-        execution_time = time.time() - start_time
+        execution_time = time.monotonic() - start_time
         
         result = {
             'status': 'success',
             'message': 'Celery is working correctly!',
             'task_id': self.request.id,
-            'execution_time': round(execution_time, 2),
+            'execution_time': round(execution_time, 4),
             'timestamp': timezone.now().isoformat(),
             'worker_hostname': getattr(self.request, 'hostname', 'unknown')
         }
         
-        logger.info(f"Celery connection test successful: {result}")
+        logger.info("Celery connection test successful: %s", result)
         return result
         
     except Exception as exc:
-        logger.error(f"Celery connection test failed: {str(exc)}")
+        logger.error("Celery connection test failed: %s", exc)
         raise exc
\ No newline at end of file
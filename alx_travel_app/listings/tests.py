@@ -1,3 +1,540 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from celery.exceptions import SoftTimeLimitExceeded
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from .models import Booking, Listing, Review, UserProfile
+from .pagination import CreatedAtCursorPagination
+from .serializers import ListingListSerializer
+from .tasks import (
+    _send_over_one_connection,
+    flush_admin_notifications,
+    queue_daily_booking_reminders,
+    send_admin_notification,
+    send_booking_confirmation_email,
+    send_booking_reminder_emails_batch,
+)
+from .views import ListingViewSet
+
+
+def make_user(username, **kwargs):
+    # The post_save receiver gives every user a guest profile
+    user = User.objects.create_user(username = username, email = f"{username}@example.com", password = 'pass', **kwargs)
+    return user, UserProfile.objects.get(linked_user = user)
+
+
+def make_listing(host, **kwargs):
+    fields = {
+        'host': host,
+        'name': 'Beach House',
+        'description': 'A house by the beach',
+        'property_type': Listing.PROPERTY_TYPE_CHOICES[0][0],
+        'room_type': Listing.ROOM_TYPE_CHOICES[0][0],
+        'city': 'Mombasa',
+        'county': 'Mombasa',
+        'postal_code': '80100',
+        'bedroom': 2,
+        'bathroom': 1,
+        'max_guests': 4,
+        'price_per_night': Decimal('100.00'),
+        'status': 'approved',
+    }
+    fields.update(kwargs)
+    return Listing.objects.create(**fields)
+
+
+def make_booking(listing, guest, start_in_days = 10, nights = 3, **kwargs):
+    start_date = timezone.now() + timedelta(days = start_in_days)
+    return Booking.objects.create(
+        listing = listing,
+        user = guest,
+        start_date = start_date,
+        end_date = start_date + timedelta(days = nights),
+        total_price = listing.price_per_night * nights,
+        **kwargs
+    )
+
+
+class BookingFixtureMixin:
+    """ A host, a guest and one approved listing """
+
+    def setUp(self):
+        # Dedup keys, task states and cached pages live in the cache, start every test from an empty one
+        cache.clear()
+        self.host_user, self.host = make_user('host')
+        self.host.role = 'host'
+        self.host.save(update_fields = ['role'])
+        self.guest_user, self.guest = make_user('guest')
+        self.listing = make_listing(self.host)
+
+
+class ConfirmationEmailDedupTests(BookingFixtureMixin, APITestCase):
+
+    def test_repeat_confirmation_is_skipped(self):
+        booking = make_booking(self.listing, self.guest)
+        send_booking_confirmation_email.apply(kwargs = {'booking_id': str(booking.booking_id)})
+        result = send_booking_confirmation_email.apply(kwargs = {'booking_id': str(booking.booking_id)})
+        self.assertEqual(result.get(), 'duplicate')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_date_change_sends_a_new_confirmation(self):
+        booking = make_booking(self.listing, self.guest)
+        send_booking_confirmation_email.apply(kwargs = {'booking_id': str(booking.booking_id)})
+
+        new_start = booking.start_date + timedelta(days = 30)
+        self.client.force_authenticate(self.guest_user)
+        with self.captureOnCommitCallbacks(execute = True):
+            response = self.client.patch(f'/api/v1/bookings/{booking.booking_id}/', {
+                'start_date': new_start.isoformat(),
+                'end_date': (new_start + timedelta(days = 3)).isoformat(),
+            }, format = 'json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_test_emails_are_not_deduplicated(self):
+        self.client.force_authenticate(self.guest_user)
+        for _ in range(2):
+            response = self.client.post('/api/v1/api/send-test-email/')
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class DailyReminderTests(BookingFixtureMixin, TestCase):
+
+    def test_reminds_confirmed_bookings_checking_in_tomorrow(self):
+        make_booking(self.listing, self.guest, start_in_days = 1, status = 'confirmed')
+        make_booking(self.listing, self.guest, start_in_days = 1, nights = 1, status = 'canceled')
+        make_booking(self.listing, self.guest, start_in_days = 5, status = 'confirmed')
+
+        self.assertEqual(queue_daily_booking_reminders.apply().get(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('tomorrow', mail.outbox[0].body)
+
+
+class ReminderBatchTests(BookingFixtureMixin, TestCase):
+
+    def test_redelivered_batch_skips_guests_already_reminded(self):
+        booking_ids = [str(make_booking(self.listing, self.guest, start_in_days = days).booking_id) for days in (1, 5)]
+        send_booking_reminder_emails_batch.apply(args = [booking_ids[:1]])
+        send_booking_reminder_emails_batch.apply(args = [booking_ids])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_soft_time_limit_stops_the_batch(self):
+        connection = mock.Mock()
+        connection.send_messages.side_effect = SoftTimeLimitExceeded()
+        with self.assertRaises(SoftTimeLimitExceeded):
+            _send_over_one_connection([mock.Mock(), mock.Mock()], connection)
+        self.assertEqual(connection.send_messages.call_count, 1)
+        connection.close.assert_called_once()
+
+
+class AdminNotificationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch.object(flush_admin_notifications, 'apply_async')
+    def test_repeats_are_held_for_one_digest(self, schedule_flush):
+        for number in range(3):
+            send_admin_notification('Disk full', f'alert {number}')
+        # The first alert goes out, the two repeats wait for a single scheduled flush
+        self.assertEqual(len(mail.outbox), 1)
+        schedule_flush.assert_called_once()
+
+        flush_admin_notifications('Disk full', ['admin@example.com'])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('(x2)', mail.outbox[1].subject)
+        self.assertIn('alert 1', mail.outbox[1].body)
+        self.assertIn('alert 2', mail.outbox[1].body)
+
+        # Held after the flush: scheduled again, and only the new alert is in the next digest
+        send_admin_notification('Disk full', 'alert 3')
+        self.assertEqual(schedule_flush.call_count, 2)
+        flush_admin_notifications('Disk full', ['admin@example.com'])
+        self.assertIn('(x1)', mail.outbox[2].subject)
+        self.assertNotIn('alert 1', mail.outbox[2].body)
+
+
+class CursorPaginationTests(BookingFixtureMixin, APITestCase):
+
+    def walk(self, url):
+        # Follow the next links, returning every row seen
+        rows = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            rows.extend(response.data['results'])
+            url = response.data['next']
+        return rows
+
+    def test_ties_on_a_non_unique_ordering_are_paged_once(self):
+        # Same price everywhere, more rows than one page
+        for number in range(24):
+            make_listing(self.host, name = f'Listing {number}')
+
+        rows = self.walk('/api/v1/listings/?ordering=price_per_night')
+        expected = Listing.objects.order_by('price_per_night', 'pk').values_list('property_id', flat = True)
+        self.assertEqual([row['property_id'] for row in rows], [str(pk) for pk in expected])
+
+    def test_pk_is_added_as_a_tiebreaker(self):
+        request = Request(APIRequestFactory().get('/api/v1/listings/', {'ordering': '-price_per_night'}))
+        view = ListingViewSet(request = request, format_kwarg = None)
+        ordering = CreatedAtCursorPagination().get_ordering(request, Listing.objects.all(), view)
+        self.assertEqual(ordering, ('-price_per_night', '-pk'))
+
+    def test_default_order_is_newest_first(self):
+        for number in range(24):
+            make_listing(self.host, name = f'Listing {number}')
+
+        rows = self.walk('/api/v1/listings/')
+        expected = list(Listing.objects.order_by('-created_at', '-pk').values_list('property_id', flat = True))
+        self.assertEqual([row['property_id'] for row in rows], [str(pk) for pk in expected])
+
+
+class BookingMaxStayTests(BookingFixtureMixin, TestCase):
+
+    def long_stay(self):
+        start_date = timezone.now() + timedelta(days = 10)
+        return {
+            'listing': self.listing,
+            'user': self.guest,
+            'start_date': start_date,
+            'end_date': start_date + timedelta(days = Booking.MAX_STAY_NIGHTS + 1),
+            'total_price': Decimal('1.00'),
+        }
+
+    def test_full_clean_rejects_a_stay_past_the_limit(self):
+        with self.assertRaises(ValidationError):
+            Booking(**self.long_stay()).full_clean()
+
+    def test_database_rejects_a_stay_past_the_limit(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(**self.long_stay())
+
+    def test_api_rejects_a_partial_day_past_the_limit(self):
+        start_date = timezone.now() + timedelta(days = 10)
+        client = APIClient()
+        client.force_authenticate(self.guest_user)
+        response = client.post('/api/v1/bookings/', {
+            'property_id': str(self.listing.property_id),
+            'start_date': start_date.isoformat(),
+            'end_date': (start_date + timedelta(days = Booking.MAX_STAY_NIGHTS, hours = 12)).isoformat(),
+            'guests': 1,
+        }, format = 'json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_bulk_import_rejects_a_stay_past_the_limit(self):
+        with self.assertRaises(ValidationError):
+            Booking.bulk_from_dicts([self.long_stay()])
+        self.assertFalse(Booking.objects.exists())
+
+
+class BookingUpdateTests(BookingFixtureMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.guest_user)
+        self.booking = make_booking(self.listing, self.guest, start_in_days = 10, nights = 3)
+
+    def patch(self, **dates):
+        return self.client.patch(
+            f'/api/v1/bookings/{self.booking.booking_id}/',
+            {name: value.isoformat() for name, value in dates.items()},
+            format = 'json'
+        )
+
+    def test_new_dates_reprice_the_booking(self):
+        response = self.patch(end_date = self.booking.start_date + timedelta(days = 5))
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.total_price, self.listing.price_per_night * 5)
+        self.assertEqual(response.data['duration_nights'], 5)
+
+    def test_new_dates_overlapping_another_booking_are_rejected(self):
+        other = make_booking(self.listing, self.guest, start_in_days = 20, nights = 3)
+        response = self.patch(end_date = other.start_date + timedelta(days = 1))
+        self.assertEqual(response.status_code, 400)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.total_price, self.listing.price_per_night * 3)
+
+    def test_moving_within_its_own_dates_is_allowed(self):
+        response = self.patch(start_date = self.booking.start_date + timedelta(days = 1))
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.total_price, self.listing.price_per_night * 2)
+
+    def test_end_before_the_current_start_is_rejected(self):
+        response = self.patch(end_date = self.booking.start_date - timedelta(days = 1))
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryCountTests(BookingFixtureMixin, APITestCase):
+    """ The optimized() querysets keep every page at a fixed number of queries, however many rows it shows """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.guest_user)
+        for number in range(5):
+            listing = make_listing(self.host, name = f'Listing {number}')
+            booking = make_booking(listing, self.guest, start_in_days = 10 + number)
+            Review.objects.create(booking = booking, listing = listing, user = self.guest, rating = 4)
+        self.booking = booking
+        # Start from an empty page cache, the rating signals above bumped its version
+        cache.clear()
+
+    def test_listing_list(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/v1/listings/')
+
+    def test_listing_detail(self):
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/v1/listings/{self.listing.property_id}/')
+
+    def test_listing_reviews(self):
+        # The requesting user's profile, the reviews and their prefetched listings
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/v1/listings/{self.booking.listing_id}/reviews/')
+
+    def test_booking_list(self):
+        # The requesting user's profile, the bookings and their prefetched listings
+        with self.assertNumQueries(3):
+            self.client.get('/api/v1/bookings/')
+
+    def test_booking_detail(self):
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/v1/bookings/{self.booking.booking_id}/')
+
+    def test_review_list(self):
+        with self.assertNumQueries(3):
+            self.client.get('/api/v1/reviews/')
+
+
+class BookingCreateTests(BookingFixtureMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.guest_user)
+
+    def post(self, start_date, nights):
+        with self.captureOnCommitCallbacks(execute = True):
+            return self.client.post('/api/v1/bookings/', {
+                'property_id': str(self.listing.property_id),
+                'start_date': start_date.isoformat(),
+                'end_date': (start_date + timedelta(days = nights)).isoformat(),
+                'guests': 2,
+            }, format = 'json')
+
+    def test_booking_is_priced_and_confirmed_by_email(self):
+        response = self.post(timezone.now() + timedelta(days = 10), 3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total_price']), self.listing.price_per_night * 3)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_overlapping_dates_are_rejected(self):
+        existing = make_booking(self.listing, self.guest, start_in_days = 10, nights = 3)
+        response = self.post(existing.start_date + timedelta(days = 1), 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_dates_of_a_cancelled_booking_are_free(self):
+        existing = make_booking(self.listing, self.guest, start_in_days = 10, nights = 3, status = 'canceled')
+        response = self.post(existing.start_date, 3)
+        self.assertEqual(response.status_code, 201)
+
+
+class BookingTransitionTests(BookingFixtureMixin, TestCase):
+
+    def test_transition_from_an_allowed_status(self):
+        booking = make_booking(self.listing, self.guest)
+        self.assertTrue(booking.transition('confirmed', allowed_from = ['pending']))
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertEqual(Booking.objects.get(pk = booking.pk).status, 'confirmed')
+
+    def test_stale_instance_does_not_overwrite_a_concurrent_change(self):
+        booking = make_booking(self.listing, self.guest)
+        # Cancelled elsewhere after this instance was loaded
+        Booking.objects.get(pk = booking.pk).transition('canceled', allowed_from = ['pending', 'confirmed'])
+
+        self.assertFalse(booking.transition('confirmed', allowed_from = ['pending']))
+        self.assertEqual(booking.status, 'pending')
+        self.assertEqual(Booking.objects.get(pk = booking.pk).status, 'canceled')
+
+    def test_confirm_endpoint_rejects_a_cancelled_booking(self):
+        booking = make_booking(self.listing, self.guest, status = 'canceled')
+        client = APIClient()
+        client.force_authenticate(self.host_user)
+        response = client.post(f'/api/v1/bookings/{booking.booking_id}/confirm/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.get(pk = booking.pk).status, 'canceled')
+
+
+class TaskStatusTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, _ = make_user('guest')
+        self.client.force_authenticate(self.user)
+
+    def queue_test_task(self):
+        # Tasks run eagerly in tests, the worker signals push the state into this process's cache
+        response = self.client.post('/api/v1/api/test-celery/')
+        self.assertEqual(response.status_code, 202)
+        return response
+
+    def test_status_of_a_finished_task(self):
+        task_id = self.queue_test_task().data['task_id']
+        response = self.client.get(f'/api/v1/api/email-task-status/{task_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'SUCCESS')
+        self.assertTrue(response.data['successful'])
+        self.assertEqual(response.data['result']['task_id'], task_id)
+
+    def test_location_header_points_at_the_status(self):
+        response = self.queue_test_task()
+        self.assertEqual(response['Location'], f"/api/v1/api/email-task-status/{response.data['task_id']}/")
+
+    def test_unchanged_status_is_not_modified(self):
+        task_id = self.queue_test_task().data['task_id']
+        first = self.client.get(f'/api/v1/api/email-task-status/{task_id}/')
+        repeat = self.client.get(f'/api/v1/api/email-task-status/{task_id}/', HTTP_IF_NONE_MATCH = first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+
+    @mock.patch('listings.views.task_status_cache_shared', return_value = False)
+    def test_process_local_cache_falls_back_to_the_result_backend(self, cache_shared):
+        task_id = self.queue_test_task().data['task_id']
+        with mock.patch('listings.views.AsyncResult') as async_result:
+            async_result.return_value.backend.get_task_meta.return_value = {'status': 'STARTED'}
+            response = self.client.get(f'/api/v1/api/email-task-status/{task_id}/')
+        # The SUCCESS pushed into this process's cache is ignored
+        self.assertEqual(response.data['status'], 'STARTED')
+        self.assertFalse(response.data['ready'])
+
+    def test_batched_status_keeps_the_request_order(self):
+        task_id = self.queue_test_task().data['task_id']
+        with mock.patch('listings.views.current_app') as app:
+            app.backend.get_task_meta.return_value = {'status': 'PENDING'}
+            response = self.client.post('/api/v1/api/email-task-status/', {
+                'task_ids': ['unknown', task_id, 'unknown'],
+            }, format = 'json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), ['unknown', task_id])
+        self.assertEqual(response.data['unknown']['status'], 'PENDING')
+        self.assertEqual(response.data[task_id]['status'], 'SUCCESS')
+
+    def test_batched_status_rejects_a_non_list(self):
+        response = self.client.post('/api/v1/api/email-task-status/', {'task_ids': 'abc'}, format = 'json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ListingCacheTests(BookingFixtureMixin, APITestCase):
+
+    def names(self):
+        return [row['name'] for row in self.client.get('/api/v1/listings/').data['results']]
+
+    def test_listing_save_invalidates_the_cached_list(self):
+        self.assertEqual(self.names(), ['Beach House'])
+        # Served from the cache while nothing changed
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Beach House'])
+
+        self.listing.name = 'Lake House'
+        self.listing.save()
+        self.assertEqual(self.names(), ['Lake House'])
+
+    def test_review_save_refreshes_the_cached_rating(self):
+        response = self.client.get('/api/v1/listings/')
+        self.assertEqual(response.data['results'][0]['review_count'], 0)
+
+        booking = make_booking(self.listing, self.guest)
+        Review.objects.create(booking = booking, listing = self.listing, user = self.guest, rating = 4)
+        row = self.client.get('/api/v1/listings/').data['results'][0]
+        self.assertEqual(row['review_count'], 1)
+        self.assertEqual(row['average_rating'], 4)
+
+    def test_etag_revalidation(self):
+        first = self.client.get('/api/v1/listings/')
+        repeat = self.client.get('/api/v1/listings/', HTTP_IF_NONE_MATCH = first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        self.listing.save()
+        changed = self.client.get('/api/v1/listings/', HTTP_IF_NONE_MATCH = first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_booking_changes_invalidate_the_availability_filter(self):
+        day = (timezone.now() + timedelta(days = 11)).date().isoformat()
+        url = f'/api/v1/listings/?available_from={day}'
+        self.assertEqual(len(self.client.get(url).data['results']), 1)
+
+        booking = make_booking(self.listing, self.guest, start_in_days = 10, nights = 3)
+        self.assertEqual(len(self.client.get(url).data['results']), 0)
+
+        # A conditional UPDATE with no post_save, the dates are free again
+        booking.transition('canceled', allowed_from = ['pending'])
+        self.assertEqual(len(self.client.get(url).data['results']), 1)
+
+    def test_list_shows_the_start_of_the_description(self):
+        self.listing.description = 'Sea view. ' * 50
+        self.listing.save()
+        row = self.client.get('/api/v1/listings/').data['results'][0]
+        self.assertEqual(row['description'], self.listing.description[:ListingListSerializer.DESCRIPTION_PREVIEW_LENGTH])
+
+class ListingLocationFilterTests(BookingFixtureMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        make_listing(self.host, name = 'Bay Loft', city = 'San Francisco', county = 'San Francisco')
+
+    def names(self, url):
+        return [row['name'] for row in self.client.get(url).data['results']]
+
+    def test_city_and_county_match_a_substring_inside_a_word(self):
+        self.assertEqual(self.names('/api/v1/listings/?city=cisco'), ['Bay Loft'])
+        self.assertEqual(self.names('/api/v1/listings/?county=basa'), ['Beach House'])
+
+    def test_search_endpoint_matches_a_substring_of_the_city(self):
+        self.client.force_authenticate(self.guest_user)
+        self.assertEqual(self.names('/api/v1/listings/search/?city=ranc'), ['Bay Loft'])
+
+class BookingBulkImportTests(BookingFixtureMixin, TestCase):
+
+    def row(self, start_in_days, nights = 3, **kwargs):
+        start_date = timezone.now() + timedelta(days = start_in_days)
+        return {
+            'listing': self.listing,
+            'user': self.guest,
+            'start_date': start_date,
+            'end_date': start_date + timedelta(days = nights),
+            'total_price': self.listing.price_per_night * nights,
+            **kwargs
+        }
+
+    def test_overlap_with_a_stored_booking_is_rejected(self):
+        make_booking(self.listing, self.guest, start_in_days = 10, nights = 3)
+        with self.assertRaises(ValidationError):
+            Booking.bulk_from_dicts([self.row(20), self.row(11)])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_overlap_within_the_batch_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            Booking.bulk_from_dicts([self.row(10), self.row(12)])
+        self.assertFalse(Booking.objects.exists())
 
-# Create your tests here.
+    def test_cancelled_rows_do_not_block(self):
+        make_booking(self.listing, self.guest, start_in_days = 10, nights = 3, status = 'canceled')
+        Booking.bulk_from_dicts([self.row(10), self.row(11, status = 'canceled'), self.row(13)])
+        self.assertEqual(Booking.objects.count(), 4)
@@ -21,12 +21,16 @@ from .views import (
     BookingViewSet,
     ReviewViewSet,
     check_email_task_status,
+    check_email_task_statuses,
     test_celery,
     send_test_email
 )
 
 # Create a router and register our viewsets
 router = DefaultRouter()
+# No client uses the .json style suffix routes, they only doubled the patterns resolve() walks on every request.
+# The API root view is kept as the browsable index of the endpoints
+router.include_format_suffixes = False
 
 # Register viewsets with the router
 # This automatically creates all CRUD endpoints
@@ -47,6 +51,7 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     # Task monitoring endpoints
+    path('api/email-task-status/', check_email_task_statuses, name='email_task_statuses'),
     path('api/email-task-status/<str:task_id>/', check_email_task_status, name='email_task_status'),
     path('api/test-celery/', test_celery, name='test_celery'),
     path('api/send-test-email/', send_test_email, name='send_test_email'),
@@ -10,40 +10,128 @@ This file contains ViewSets that provide RESTful API endpoints for:
 Each ViewSet provides full CRUD operations with proper permissions,
 filtering, searching, and pagination.
 """
+import hashlib
 import logging
 
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q, Avg
-from datetime import date
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
 from django.utils import timezone
+from celery import current_app, states
+from celery.backends.base import BaseKeyValueStoreBackend
+from celery.exceptions import TimeoutError as CeleryTimeoutError
 from celery.result import AsyncResult
+from celery.utils import uuid
+from django.core.cache import cache
 
-from .models import UserProfile, Listing, Booking, Review
+from .models import UserProfile, Listing, Booking, Review, listing_cache_version
 from .serializers import (
     UserProfileSerializer, 
     ListingSerializer, 
+    ListingListSerializer,
     BookingSerializer, 
     ReviewSerializer
 )
-from .filters import ListingFilter, BookingFilter  # We'll create these
+from .filters import ListingFilter, ListingSearchFilter, BookingFilter, QueryParamFilterBackend  # We'll create these
+from .pagination import CreatedAtCursorPagination, ReviewCursorPagination
 from.tasks import (
     send_booking_confirmation_email,
     send_booking_reminder_email,
     send_booking_cancellation_email,
     cleanup_old_logs,
-    test_celery_connection
+    test_celery_connection,
+    task_status_cache_shared,
+    task_status_key
 )
 
 logger = logging.getLogger(__name__)
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+# How long a listing list or search page is served from the cache
+LISTING_CACHE_TIMEOUT = 30
+
+# Longest a task status request may block with ?wait=, it holds a web worker while it waits
+TASK_STATUS_MAX_WAIT = 10
+
+# Formats datetimes the way the serializers render them, for responses built by hand
+_datetime_field = DateTimeField()
+
+# Most task ids a batched status request may ask about
+TASK_STATUS_BATCH_LIMIT = 100
+
+
+def _parse_price(value):
+    """
+    Parse a price query parameter once into a Decimal, the type of the price columns.
+    Returns None for missing or invalid values.
+    """
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        return None
+    return price.quantize(Decimal('0.01')) if price.is_finite() else None
+
+
+def _parse_int(value):
+    """
+    Parse an integer query parameter once, so the filter is bound as a number.
+    Returns None for missing or invalid values.
+    """
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _enqueue_on_commit(task, **kwargs):
+    """
+    Queue a task once the current transaction commits, so the worker never looks up a row
+    that isn't visible yet and the broker round trip stays out of the transaction.
+    The task id is chosen up front so the response can still report it.
+    """
+    task_id = uuid()
+
+    def send():
+        try:
+            task.apply_async(kwargs=kwargs, task_id=task_id)
+        except Exception as e:
+            logger.error("Failed to queue %s: %s", task.name, e)
+
+    transaction.on_commit(send)
+    return task_id
+
+
+class CurrentProfileMixin:
+    """
+    Looks up the requesting user's profile once per request.
+    get_queryset, the actions and perform_create all need it, so the row is kept on the request.
+    """
+
+    def _get_profile(self):
+        """ The current user's UserProfile, or None if they don't have one """
+        if not hasattr(self.request, '_profile_cache'):
+            self.request._profile_cache = (
+                UserProfile.objects.optimized().filter(linked_user=self.request.user).first()
+            )
+        return self.request._profile_cache
+
+class UserProfileViewSet(CurrentProfileMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing user profiles.
     
@@ -55,14 +143,14 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     - DELETE /api/v1/users/{id}/ - Delete user
     """
     
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.optimized()
     serializer_class = UserProfileSerializer
     lookup_field = 'user_id'  # Use UUID instead of default pk
     
     # Filtering and searching
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['role', 'email_verified']
-    search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name']
+    search_fields = ['linked_user__username', 'linked_user__email', 'linked_user__first_name', 'linked_user__last_name']
     
     def get_permissions(self):
         """
@@ -86,24 +174,26 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         Get current user's profile.
         GET /api/v1/users/me/
         """
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            serializer = self.get_serializer(profile)
-            return Response(serializer.data)
-        except UserProfile.DoesNotExist:
+        # Profile and user come back in one joined SELECT
+        profile = self._get_profile()
+        if profile is None:
             return Response(
                 {'error': 'Profile not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        serializer = self.get_serializer(profile)
+        return Response(serializer.data)
     
-    @action(detail=True, methods=['get'])
+    # Nested lists page by cursor like the top level endpoints, not by COUNT + OFFSET
+    @action(detail=True, methods=['get'], pagination_class=CreatedAtCursorPagination)
     def listings(self, request, user_id=None):
         """
         Get all listings for a specific user (host).
         GET /api/v1/users/{id}/listings/
         """
         user_profile = self.get_object()
-        listings = Listing.objects.filter(host=user_profile)
+        # Same recipes as the listing and booking endpoints, otherwise every row queries its host
+        listings = Listing.objects.filter(host=user_profile).optimized()
         
         # Apply pagination
         page = self.paginate_queryset(listings)
@@ -114,14 +204,14 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         serializer = ListingSerializer(listings, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=CreatedAtCursorPagination)
     def bookings(self, request, user_id=None):
         """
         Get all bookings for a specific user.
         GET /api/v1/users/{id}/bookings/
         """
         user_profile = self.get_object()
-        bookings = Booking.objects.filter(user=user_profile)
+        bookings = Booking.objects.filter(user=user_profile).optimized()
         
         # Apply pagination
         page = self.paginate_queryset(bookings)
@@ -133,7 +223,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(CurrentProfileMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing property listings.
     
@@ -153,62 +243,80 @@ class ListingViewSet(viewsets.ModelViewSet):
     lookup_field = 'property_id'  # Use UUID instead of default pk
 
     # Filtering, searching, and ordering
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [QueryParamFilterBackend, ListingSearchFilter, filters.OrderingFilter]
     filterset_class = ListingFilter  # Custom filter class (we'll create this)
     search_fields = ['name', 'description', 'city', 'county']
     ordering_fields = ['price_per_night', 'created_at', 'name']
     ordering = ['-created_at']  # Default ordering (newest first)
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """ Filter listings based on query parameters and user permissions."""
         # Base query on approved listings
-        if self.action == 'list':
+        if self.action in ('list', 'count'):
             # For list view, only show approved listings
-            queryset = Listing.objects.filter(status='approved').select_related('host__user')
-        queryset = self.queryset
-
-        #Filter by city
-        city = self.request.query_params.get('City', None)
-        if city:
-            queryset = queryset.filter(city__icontains=city)
-        
-        #Filter by property type
-        property_type = self.request.query_params.get('property_type', None)
-        if property_type:
-            queryset = queryset.filter(property_type__icontains=property_type)
-
-        # Filter by max guests
-        max_guests = self.request.query_params.get('max_guests', None)
-        if max_guests:
-            try:
-                max_guests = int(max_guests)
-                queryset = queryset.filter(max_guests__gte=max_guests)
-            except ValueError:
-                pass
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price', None)
-        max_price = self.request.query_params.get('max_price', None)
-
-        if min_price:
-            try:
-                min_price = float(min_price)
-                queryset = queryset.filter(price_per_night__gte=min_price)
-            except ValueError:
-                pass
+            queryset = Listing.objects.filter(status='approved')
+        else:
+            queryset = Listing.objects.all()
 
-        if max_price:
-            try:
-                max_price = float(max_price)
-                queryset = queryset.filter(price_per_night__lte=max_price)
-            except ValueError:
-                pass
+        # The host comes back with the rows (rating stats are columns on the listing).
+        # count only needs the matching rows, not the join
+        if self.action != 'count':
+            queryset = queryset.optimized()
+        if self.action == 'list':
+            # Only load the columns the list serializer renders, and the start of the description
+            queryset = queryset.only(*ListingListSerializer.ONLY_FIELDS).annotate(
+                description_preview=ListingListSerializer.description_preview()
+            )
 
+        # Query parameters are applied once, by ListingFilter for list/count and by search() for
+        # its own parameters, instead of a second time here for every action
+        return queryset
     
+    def list(self, request, *args, **kwargs):
+        # Same filter combinations repeat across users, serve them from the cache
+        return self._cached_response(request, lambda: super(ListingViewSet, self).list(request, *args, **kwargs))
+
+    def _cached_response(self, request, compute):
+        """
+        Serve a read-only listing response from the cache.
+
+        Pages are cached for LISTING_CACHE_TIMEOUT seconds per URL and Accept header, and
+        invalidated as soon as a listing, review or booking changes (see listing_cache_version).
+        A weak ETag lets clients revalidate with If-None-Match and get a 304.
+        """
+        version = listing_cache_version()
+        params = hashlib.sha1(
+            f"{request.build_absolute_uri()}|{request.headers.get('Accept', '')}".encode()
+        ).hexdigest()
+        etag = f'W/"{version}-{params[:16]}"'
+        headers = {'ETag': etag, 'Vary': 'Accept'}
+
+        # The client already holds this version of the page
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache_key = f"listings:{self.action}:{version}:{params}"
+        data = cache.get(cache_key)
+        if data is None:
+            response = compute()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(cache_key, data, LISTING_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
+
+    def get_serializer_class(self):
+        # The list endpoint uses the narrower serializer, everything else gets the full listing
+        if self.action == 'list':
+            return ListingListSerializer
+        return ListingSerializer
+
     def get_permissions(self):
         """
         Set permissions based on action.
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'count']:
             # Anyone can view listings
             permission_classes = [permissions.AllowAny]
         elif self.action == 'create':
@@ -224,27 +332,24 @@ class ListingViewSet(viewsets.ModelViewSet):
         """
         Set the host to the current user when creating a listing.
         """
-        # Get or create user profile for the current user
-        user_profile, created = UserProfile.objects.get_or_create(
-            user=self.request.user,
-            defaults={'role': 'host'}
-        )
+        # Profiles are created alongside the user (see create_user_profile)
+        user_profile = self._get_profile()
         
-        # If user is not a host, update their role
+        # If user is not a host, update their role (just the one column)
         if user_profile.role == 'guest':
+            UserProfile.objects.filter(pk=user_profile.pk).update(role='host')
             user_profile.role = 'host'
-            user_profile.save()
         
         serializer.save(host=user_profile)
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=ReviewCursorPagination)
     def reviews(self, request, property_id=None):
         """
         Get all reviews for a specific listing.
         GET /api/v1/listings/{id}/reviews/
         """
         listing = self.get_object()
-        reviews = Review.objects.filter(property=listing).select_related('user__user')
+        reviews = Review.objects.filter(listing=listing).optimized()
         
         # Apply pagination
         page = self.paginate_queryset(reviews)
@@ -255,6 +360,18 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def count(self, request):
+        """
+        Number of listings matching the list endpoint's filters.
+        GET /api/v1/listings/count/?min_price=100&search=villa
+
+        List pages use cursor pagination and don't carry a total, so the COUNT(*)
+        only runs for clients that ask for it here.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({'count': queryset.count()})
+
     @action(detail=True, methods=['get'])
     def availability(self, request, property_id=None):
         """
@@ -272,7 +389,6 @@ class ListingViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            from datetime import datetime
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         except ValueError:
@@ -282,20 +398,13 @@ class ListingViewSet(viewsets.ModelViewSet):
             )
         
         # Check for conflicting bookings
-        conflicting_bookings = Booking.objects.filter(
-            property=listing,
-            status__in=['pending', 'confirmed'],
-            start_date__lt=end_date,
-            end_date__gt=start_date
-        )
-        
-        is_available = not conflicting_bookings.exists()
+        conflicting_count = Booking.objects.overlapping(listing, start_date, end_date).count()
         
         return Response({
-            'available': is_available,
+            'available': conflicting_count == 0,
             'start_date': start_date,
             'end_date': end_date,
-            'conflicting_bookings': conflicting_bookings.count()
+            'conflicting_bookings': conflicting_count
         })
     
     @action(detail=False, methods=['get'])
@@ -303,30 +412,35 @@ class ListingViewSet(viewsets.ModelViewSet):
         """
         Advanced search for listings.
         GET /api/v1/listings/search/?city=New York&min_price=100&max_price=300
+        GET /api/v1/listings/search/?lat=40.71&lng=-74.00&radius_km=25
+
+        Results are cached, see _cached_response().
         """
-        queryset = self.get_queryset()
-        
-        # Location search
-        city = request.query_params.get('city')
-        if city:
-            queryset = queryset.filter(city__icontains=city)
-        
-        # Price range
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        if min_price:
-            queryset = queryset.filter(price_per_night__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price_per_night__lte=max_price)
+        return self._cached_response(request, lambda: self._search(request))
+
+    def _search(self, request):
+        params = request.query_params
         
-        # Property specifications
-        bedrooms = request.query_params.get('bedrooms')
-        if bedrooms:
-            queryset = queryset.filter(bedrooms__gte=bedrooms)
+        # Numbers are parsed once up front so they're bound as numbers (the column is 'bedroom')
+        lookups = {
+            'city__icontains': params.get('city') or None,
+            'price_per_night__gte': _parse_price(params.get('min_price')),
+            'price_per_night__lte': _parse_price(params.get('max_price')),
+            'bedroom__gte': _parse_int(params.get('bedrooms')),
+            'max_guests__gte': _parse_int(params.get('guests')),
+        }
+        # All the search criteria go into a single filter() call
+        queryset = self.get_queryset().filter(**{lookup: value for lookup, value in lookups.items() if value is not None})
         
-        guests = request.query_params.get('guests')
-        if guests:
-            queryset = queryset.filter(max_guests__gte=guests)
+        # Radius search around a point
+        lat = params.get('lat')
+        lng = params.get('lng')
+        if lat and lng:
+            try:
+                radius = float(params.get('radius_km', 10))
+                queryset = queryset.near(float(lat), float(lng), radius)
+            except ValueError:
+                pass
         
         # Apply pagination
         page = self.paginate_queryset(queryset)
@@ -338,7 +452,7 @@ class ListingViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(CurrentProfileMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing bookings/reservations.
     
@@ -356,120 +470,50 @@ class BookingViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     # Filtering and ordering
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [QueryParamFilterBackend, filters.OrderingFilter]
     filterset_class = BookingFilter  # Custom filter class
     ordering_fields = ['start_date', 'created_at', 'total_price']
     ordering = ['-created_at']
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """
         Return bookings based on user role.
         - Guests see their own bookings
         - Hosts see bookings for their properties
-        - Admins see all bookings
+        - Admins (and superusers) see all bookings
         """
-        user = self.request.user
+        # Superusers see everything, known from request.user without looking up the profile
+        if self.request.user.is_superuser:
+            return Booking.objects.all().optimized()
         
-        try:
-            user_profile = UserProfile.objects.get(user=user)
-        except UserProfile.DoesNotExist:
+        user_profile = self._get_profile()
+        if user_profile is None:
             return Booking.objects.none()
         
         if user_profile.role == 'admin':
             # Admins can see all bookings
-            return Booking.objects.all().select_related('property', 'user__user')
+            return Booking.objects.all().optimized()
         elif user_profile.role == 'host':
             # Hosts see bookings for their properties
             return Booking.objects.filter(
-                property__host=user_profile
-            ).select_related('property', 'user__user')
+                listing__host=user_profile
+            ).optimized()
         else:
             # Guests see only their own bookings
             return Booking.objects.filter(
                 user=user_profile
-            ).select_related('property', 'user__user')
+            ).optimized()
         
     def create(self, request, *args, **kwargs):
         """
         Create a new booking and send confirmation email asynchronously.
         """
-        # Get user profile
-        try:
-            user_profile = get_object_or_404(UserProfile, user=request.user)
-
-            # Add user_id to the request data
-            mutable_data = request.data.copy()
-            mutable_data['user_id'] = str(user_profile.user_id)
+        response = super().create(request, *args, **kwargs)
+        response.data['email_task_id'] = self.email_task_id
+        response.data['message'] = "Booking created successfully. Confirmation email will be sent to you shortly."
+        return response
 
-            # Create a serializer with modified data
-            serializer = self.get_serializer(data=mutable_data)
-
-            if serializer.is_valid():
-                # Save the booking
-                booking = serializer.save()
-
-                # Get the booking details for email
-                user = request.user
-                user_email = user.email
-                user_name = user.get_full_name() or user.username
-
-                # Get listing details
-                listing = booking.property
-                listing_title = listing.name
-
-                # Format dates
-                check_in_date = booking.start_date.strftime('%B %d, %Y')
-                check_out_date = booking.end_date.strftime('%B %d, %Y')
-
-                # Prepare additional booking details
-                booking_details = {
-                    'duration_nights': booking.duration_nights,
-                    'total_price': booking.total_price,
-                    'booking_id': booking.booking_id,
-                    'guests': booking.guests,
-                    'property_type': listing.property_type,
-                    'city': listing.city,
-                    'host_name': listing.host.user.get_full_name() or listing.host.user.username,   
-                }
-
-                # Trigger the email task asynchronously
-                try:
-                    email_task = send_booking_confirmation_email.delay(
-                        booking_id=booking.booking_id,
-                        user_email=user_email,
-                        user_name=user_name,
-                        listing_title=listing_title,
-                        check_in_date=check_in_date,
-                        check_out_date=check_out_date,
-                        total_price=booking.total_price,
-                        booking_details=booking_details
-                    )
-                    #Log the task ID for tracking
-                    logger.info(f"Booking Confirmation email task queued for {booking.booking_id}, task_id: {email_task.id}")
-
-                    # Prepare response data
-                    response_data = serializer.data
-                    response_data['email_task_id'] = email_task.id
-                    response_data['message'] = "Booking created successfully. Confirmation email will be sent to you shortly."
-
-                    return Response(response_data, status=status.HTTP_201_CREATED)
-                except Exception as email_error:
-                    logger.error(f"Error sending booking confirmation email: {str(e)}")
-                    response_data = serializer.data
-                    response_data['message'] = 'Booking created successfully but email notification failed.'
-                    response_data['email_error'] = str(email_error)
-                    return Response(
-                        response_data,
-                        status=status.HTTP_201_CREATED
-                    )
-            else:
-                return Response(serializer.errors, status=status.HTTP_404_BAD_REQUEST)
-        except Exception as e:
-            logger.error(f"Error creating booking: {str(e)}")
-            return Response(
-                {'error': f"Failed to create booking: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
     def update(self, request, *args, **kwargs):
         """
         Update a booking and optionally send notification.
@@ -495,27 +539,18 @@ class BookingViewSet(viewsets.ModelViewSet):
                 
                 # Send update notification if important fields changed
                 if important_fields_changed:
-                    try:
-                        user = request.user
-                        send_booking_confirmation_email.delay(
-                            booking_id=str(updated_booking.booking_id),
-                            user_email=user.email,
-                            user_name=f"{user.first_name} {user.last_name}".strip() or user.username,
-                            listing_title=updated_booking.property.name,
-                            check_in_date=updated_booking.start_date.strftime('%B %d, %Y'),
-                            check_out_date=updated_booking.end_date.strftime('%B %d, %Y'),
-                            total_price=str(updated_booking.total_price)
-                        )
-                        logger.info(f"Update notification sent for booking {updated_booking.booking_id}")
-                    except Exception as e:
-                        logger.error(f"Failed to send update notification: {str(e)}")
+                    _enqueue_on_commit(send_booking_confirmation_email, booking_id=str(updated_booking.booking_id))
+                    logger.info("Update notification queued for booking %s", updated_booking.booking_id)
                 
                 return Response(serializer.data)
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                
+        
+        except ValidationError as e:
+            # The new dates were taken, found under the listing lock in BookingSerializer.update
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error updating booking: {str(e)}")
+            logger.error("Error updating booking: %s", e)
             return Response(
                 {'error': 'Failed to update booking'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -538,9 +573,9 @@ class BookingViewSet(viewsets.ModelViewSet):
                     listing_title=instance.property.name,
                     cancellation_reason=request.data.get('cancellation_reason', 'User requested cancellation')
                 )
-                logger.info(f"Cancellation email queued for booking {instance.booking_id}")
+                logger.info("Cancellation email queued for booking %s", instance.booking_id)
             except Exception as e:
-                logger.error(f"Failed to send cancellation email: {str(e)}")
+                logger.error("Failed to send cancellation email: %s", e)
             
             # Delete the booking
             self.perform_destroy(instance)
@@ -551,30 +586,26 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
             
         except Exception as e:
-            logger.error(f"Error cancelling booking: {str(e)}")
+            logger.error("Error cancelling booking: %s", e)
             return Response(
                 {'error': 'Failed to cancel booking'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
     @action(detail=True, methods=['post'])
-    def send_reminder(self, request, pk=None):
+    def send_reminder(self, request, booking_id=None):
         """
         Manually send a reminder email for a specific booking.
         """
         try:
             booking = self.get_object()
-            user = request.user
             
             # Calculate days until check-in
-            days_until = (booking.start_date - timezone.now().date()).days
+            days_until = (booking.start_date.date() - timezone.now().date()).days
             
+            # The worker loads and formats the rest of the email from the booking
             email_task = send_booking_reminder_email.delay(
                 booking_id=str(booking.booking_id),
-                user_email=user.email,
-                user_name=f"{user.first_name} {user.last_name}".strip() or user.username,
-                listing_title=booking.property.name,
-                check_in_date=booking.start_date.strftime('%B %d, %Y'),
                 days_until_checkin=days_until
             )
             
@@ -585,7 +616,7 @@ class BookingViewSet(viewsets.ModelViewSet):
             })
             
         except Exception as e:
-            logger.error(f"Error sending reminder: {str(e)}")
+            logger.error("Error sending reminder: %s", e)
             return Response(
                 {'error': 'Failed to send reminder email'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -594,28 +625,19 @@ class BookingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """
         Set the user to the current user when creating a booking.
+        The listing lookup and the total price are handled by BookingSerializer.create.
         """
-        # Get user profile
-        user_profile, created = UserProfile.objects.get_or_create(
-            user=self.request.user,
-            defaults={'role': 'guest'}
-        )
-        
-        # Get the property
-        property_id = serializer.validated_data.get('property_id')
-        listing = get_object_or_404(Listing, property_id=property_id)
+        # Get user profile (created alongside the user, see create_user_profile)
+        user_profile = self._get_profile()
+        if user_profile is None:
+            raise Http404("No UserProfile matches the given query.")
         
-        # Calculate total price
-        start_date = serializer.validated_data['start_date']
-        end_date = serializer.validated_data['end_date']
-        nights = (end_date - start_date).days
-        total_price = listing.price_per_night * nights
+        booking = serializer.save(user=user_profile)
         
-        serializer.save(
-            user=user_profile,
-            property=listing,
-            total_price=total_price
-        )
+        # Trigger the email task after commit, the worker loads the booking details itself
+        self.email_task_id = _enqueue_on_commit(send_booking_confirmation_email, booking_id=str(booking.booking_id))
+        #Log the task ID for tracking
+        logger.info("Booking Confirmation email task queued for %s, task_id: %s", booking.booking_id, self.email_task_id)
     
     @action(detail=True, methods=['post'])
     def confirm(self, request, booking_id=None):
@@ -625,23 +647,20 @@ class BookingViewSet(viewsets.ModelViewSet):
         """
         booking = self.get_object()
         
-        # Check if user is the host of the property
-        user_profile = UserProfile.objects.get(user=request.user)
-        if booking.property.host != user_profile:
+        # Check if user is the host of the property (ids only, the listing comes with the booking)
+        user_profile = self._get_profile()
+        if user_profile is None or booking.listing.host_id != user_profile.pk:
             return Response(
                 {'error': 'Only the property host can confirm bookings'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status != 'pending':
+        if booking.status != 'pending' or not booking.transition('confirmed', allowed_from=['pending']):
             return Response(
                 {'error': 'Only pending bookings can be confirmed'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'confirmed'
-        booking.save()
-        
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
     
@@ -654,27 +673,24 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking = self.get_object()
         
         # Check permissions (guest or host can cancel)
-        user_profile = UserProfile.objects.get(user=request.user)
-        if booking.user != user_profile and booking.property.host != user_profile:
+        user_profile = self._get_profile()
+        if user_profile is None or user_profile.pk not in (booking.user_id, booking.listing.host_id):
             return Response(
                 {'error': 'You can only cancel your own bookings or bookings for your properties'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status in ['canceled', 'completed']:
+        if booking.status in ['canceled', 'completed'] or not booking.transition('canceled', allowed_from=['pending', 'confirmed']):
             return Response(
                 {'error': f'Cannot cancel {booking.status} booking'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'canceled'
-        booking.save()
-        
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CurrentProfileMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing reviews.
     
@@ -692,42 +708,45 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     # Filtering and ordering
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['rating', 'property']
+    filterset_fields = ['rating', 'listing']
     ordering_fields = ['rating', 'created_at']
     ordering = ['-created_at']
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """
         Return reviews based on user role.
         """
-        queryset = Review.objects.all()
-        user = self.request.user
+        # Superusers see everything, known from request.user without looking up the profile
+        if self.request.user.is_superuser:
+            return Review.objects.all().optimized()
         
-        try:
-            user_profile = UserProfile.objects.get(user=user)
-        except UserProfile.DoesNotExist:
+        user_profile = self._get_profile()
+        if user_profile is None:
             return Review.objects.none()
         
         if user_profile.role == 'admin':
             # Admins can see all reviews
-            return Review.objects.all().select_related('user__user', 'property')
+            return Review.objects.all().optimized()
         elif user_profile.role == 'host':
             # Hosts see reviews for their properties
             return Review.objects.filter(
-                property__host=user_profile
-            ).select_related('user__user', 'property')
+                listing__host=user_profile
+            ).optimized()
         else:
             # Guests see reviews they've written
             return Review.objects.filter(
                 user=user_profile
-            ).select_related('user__user', 'property')
+            ).optimized()
         
     def create(self, request, *args, **kwargs):
         """
         create a new review
         """
         try:
-            user_profile = get_object_or_404(UserProfile, user=request.user)
+            user_profile = self._get_profile()
+            if user_profile is None:
+                raise Http404("No UserProfile matches the given query.")
 
             #Add user id to request data
             mutable_data = request.data.copy()
@@ -737,20 +756,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
             if serializer.is_valid():
                 review=serializer.save()
-                logger.info(f"Review created: {review.review_id}")
+                logger.info("Review created: %s", review.review_id)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
-                logger.error(f"Review creation failed: {serializer.errors}")
+                logger.error("Review creation failed: %s", serializer.errors)
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f" Error creating review: {str(e)}")
+            logger.error("Error creating review: %s", e)
             return Response({'error': f"Failed to create review: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
     def perform_create(self, serializer):
         """
         Set the user to the current user when creating a review.
         """
-        user_profile = UserProfile.objects.get(user=self.request.user)
+        user_profile = self._get_profile()
         
         # Get booking and property
         booking_id = serializer.validated_data.get('booking_id')
@@ -773,9 +792,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """
         review = self.get_object()
         
-        # Check if user is the host of the property
-        user_profile = UserProfile.objects.get(user=request.user)
-        if review.property.host != user_profile:
+        # Check if user is the host of the property (ids only, the listing comes with the review)
+        user_profile = self._get_profile()
+        if user_profile is None or review.listing.host_id != user_profile.pk:
             return Response(
                 {'error': 'Only the property host can respond to reviews'},
                 status=status.HTTP_403_FORBIDDEN
@@ -788,75 +807,217 @@ class ReviewViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.utils import timezone
+        # Only the two response columns are written. No post_save either: the rating
+        # stats and the search cache don't depend on the host response
         review.host_response = host_response
         review.host_response_date = timezone.now()
-        review.save()
+        Review.objects.filter(pk=review.pk).update(
+            host_response=review.host_response,
+            host_response_date=review.host_response_date
+        )
         
-        serializer = self.get_serializer(review)
-        return Response(serializer.data)
+        # Only the response fields changed, the rest of the review is what the client already has
+        return Response({
+            'review_id': review.review_id,
+            'host_response': review.host_response,
+            'host_response_date': _datetime_field.to_representation(review.host_response_date),
+            'has_host_response': True,
+        })
     
 
 # TASK MONITORING VIEWS
+def _task_state(task_id):
+    """
+    Return (state, result, error) for a task.
+    Reads the state pushed by the worker's task signals, and otherwise fetches the meta from
+    the backend once (AsyncResult only caches the meta of finished tasks).
+    The pushed state is skipped when the cache isn't shared with the workers.
+    """
+    if task_status_cache_shared():
+        pushed = cache.get(task_status_key(task_id))
+        if pushed is not None:
+            return pushed['status'], pushed.get('result'), pushed.get('error')
+    meta = AsyncResult(task_id).backend.get_task_meta(task_id)
+    return _result_state(meta['status'], meta.get('result'))
+
+
+def _result_state(state, result):
+    return (
+        state,
+        result if state == states.SUCCESS else None,
+        str(result) if state in states.PROPAGATE_STATES else None,
+    )
+
+
+def _task_states(task_ids):
+    """
+    Batched _task_state: {task_id: (state, result, error)}.
+    The pushed states come from one cache get_many. The rest are read with a single MGET
+    on key-value result backends (Redis), or one meta fetch each on the others.
+    """
+    keys = {task_id: task_status_key(task_id) for task_id in task_ids}
+    pushed = cache.get_many(keys.values()) if task_status_cache_shared() else {}
+    found = {}
+    missing = []
+    for task_id, key in keys.items():
+        entry = pushed.get(key)
+        if entry is not None:
+            found[task_id] = (entry['status'], entry.get('result'), entry.get('error'))
+        else:
+            missing.append(task_id)
+
+    if missing:
+        backend = current_app.backend
+        if isinstance(backend, BaseKeyValueStoreBackend):
+            task_keys = [backend.get_key_for_task(task_id) for task_id in missing]
+            values = backend.mget(task_keys)
+            if hasattr(values, 'items'):
+                # Some clients (memcached) answer with a key -> value mapping instead of a list
+                values = [values.get(key) for key in task_keys]
+            for task_id, value in zip(missing, values):
+                # Nothing stored yet means the task hasn't started (or is unknown), as AsyncResult reports it
+                meta = backend.decode_result(value) if value else {'status': states.PENDING}
+                found[task_id] = _result_state(meta['status'], meta.get('result'))
+        else:
+            for task_id in missing:
+                meta = backend.get_task_meta(task_id)
+                found[task_id] = _result_state(meta['status'], meta.get('result'))
+    return found
+
+
+def _task_status_data(task_id, state, result, error):
+    """
+    Response body for one task, shared by the single and the batched status endpoints.
+    """
+    ready = state in states.READY_STATES
+    response_data = {
+        'task_id': task_id,
+        'status': state,
+        'ready': ready,
+        'successful': state == states.SUCCESS if ready else None,
+    }
+
+    if ready:
+        if state == states.SUCCESS:
+            response_data['result'] = result
+        else:
+            response_data['error'] = error
+    else:
+        response_data['message'] = 'Task is still in progress'
+    return response_data
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_email_task_status(request, task_id):
     """
     Check the status of the email that is sending the task.
-    Usage: GET /api/email-task-status/<task_id>/
+    Usage: GET /api/email-task-status/<task_id>/?wait=5
     """
+    # Optional long poll: ?wait=N blocks for up to N seconds until the task finishes,
+    # instead of the client polling this endpoint
     try:
-        task_result = AsyncResult(task_id)
-
-        response_data = {
-            'task_id': task_id,
-            'status': task_result.status,
-            'ready': task_result.ready(),
-            'successful': task_result.successful() if task_result.ready() else None,
-        }
+        wait = float(request.query_params.get('wait', 0))
+    except ValueError:
+        wait = 0
+    wait = min(wait, TASK_STATUS_MAX_WAIT) if wait > 0 else 0
 
-        if task_result.ready():
-            if task_result.successful():
-                response_data['result'] = task_result.result
+    # Only the result store calls are guarded, the store being down is the expected failure
+    try:
+        state, result, error = _task_state(task_id)
+        if wait and state not in states.READY_STATES:
+            # On the Redis backend this waits on the task's pub/sub channel, not a sleep loop
+            task_result = AsyncResult(task_id)
+            try:
+                task_result.get(timeout=wait, interval=0.05, propagate=False)
+            except CeleryTimeoutError:
+                pass
             else:
-                response_data['error'] = str(task_result.info)
-        else:
-            response_data['message'] = 'Task is still in progress'
+                # The finished meta is cached on task_result, no further fetch
+                state, result, error = _result_state(task_result.state, task_result.result)
+    except Exception as e:
+        logger.error("Error checking task status: %s", e)
+        return Response(
+            {'error': f'Failed to check task status: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    # The body only changes with the state (a finished task's result is final), so the state is the
+    # validator: repeat polls with a matching If-None-Match get an empty 304
+    etag = f'W/"{task_id}-{state}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache, must-revalidate'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(_task_status_data(task_id, state, result, error), status=status.HTTP_200_OK, headers=headers)
 
-        return Response(response_data, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def check_email_task_statuses(request):
+    """
+    Check the status of many tasks in one request.
+    Usage: POST /api/email-task-status/
+    Body: {"task_ids": ["...", "..."]}
+    """
+    task_ids = request.data.get('task_ids')
+    if not isinstance(task_ids, list) or not all(isinstance(task_id, str) for task_id in task_ids):
+        return Response(
+            {'error': 'task_ids must be a list of task ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(task_ids) > TASK_STATUS_BATCH_LIMIT:
+        return Response(
+            {'error': f'At most {TASK_STATUS_BATCH_LIMIT} task ids per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Only the result store calls are guarded, the store being down is the expected failure
+    task_ids = list(dict.fromkeys(task_ids))
+    try:
+        found = _task_states(task_ids)
     except Exception as e:
-        logger.error(f" Error checking task status: {str(e)}")
-        return Response (
+        logger.error("Error checking task statuses: %s", e)
+        return Response(
             {'error': f'Failed to check task status: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-    
+
+    return Response({
+        task_id: _task_status_data(task_id, *found[task_id]) for task_id in task_ids
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
-@permission_classes(['IsAuthenticated'])
+@permission_classes([IsAuthenticated])
 def test_celery(request):
     """
     Test Celery connection and task execution.
     Usage: POST/api/test-celery/
     """
     try:
-        # Run the test task
-        task = test_celery_connection.delay()
+        # Run the test task. A probe shouldn't sit in publish retries, a broker problem is the answer.
+        # The result is kept: the status endpoint falls back to the result backend when the
+        # worker's task-status push isn't visible to this process
+        task = test_celery_connection.apply_async(retry=False)
+        status_url = reverse('listings:email_task_status', args=[task.id])
         return Response(
             {
             'message': 'Test task created successfully',
             'task_id': task.id,
             'status': 'Task is currently running.......',
-            'check_status_url': f'/api/email-task-status/{task.id}/'
-            }
+            'check_status_url': status_url
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url}
         )
     except Exception as e:
-        logger.error(f"Error testing celery connection: {str(e)}")
+        logger.error("Error testing celery connection: %s", e)
         return Response({
             'error': f'Celery test failed: {str(e)}',
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
-@permission_classes(['IsAuthenticated'])
+@permission_classes([IsAuthenticated])
 def send_test_email(request):
     """
     Send a test email to verify the current email functionality.
@@ -867,23 +1028,26 @@ def send_test_email(request):
         # Get the email from the request data
         email = request.data.get('email') or request.user.email
 
-        task = send_booking_confirmation_email.delay(
+        # No publish retries for a test email, the caller can simply try again
+        task = send_booking_confirmation_email.apply_async(kwargs=dict(
             booking_id="TEST-123",
             user_email=email,
             user_name=request.user.get_full_name() or request.user.username,
             listing_title="Test Property",
             check_in_date="January 1 2024",
             check_out_date="January 7 2024",
-            total_price="500.00"
-        )
+            total_price="500.00",
+            # Every test email shares the fixed booking id, don't let dedup swallow the repeats
+            dedup=False,
+        ), retry=False)
         return Response({
             'message': f'Test email successfully queued to {email}',
             'task_id': task.id,
             'status': 'Task is currently running.......',
-        })
+        }, status=status.HTTP_202_ACCEPTED, headers={'Location': reverse('listings:email_task_status', args=[task.id])})
 
     except Exception as e:
-        logger.error(f"Error sending test email:{str(e)}")
+        logger.error("Error sending test email: %s", e)
         return Response(
             {'error':f'Test email failed: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR